@@ -0,0 +1,88 @@
+import threading
+
+import cv2
+import numpy as np
+
+# Look of the annotations: cyan boxes with black-on-cyan labels
+BOX_COLOR = (255, 255, 0)
+TEXT_COLOR = (0, 0, 0)
+FONT = cv2.FONT_HERSHEY_SIMPLEX
+FONT_SCALE = 1.0
+FONT_THICKNESS = 2
+BOX_THICKNESS = 4
+
+# Label sprites are drawn at scales snapped to steps of 1/SCALE_STEPS (at most SCALE_STEPS of them, since
+# annotations are only ever shrunk), so the cache below is bounded by classes x 101 buckets x SCALE_STEPS
+SCALE_STEPS = 16
+
+# Rendered label sprites keyed by (label, confidence bucket, snapped scale)
+_sprites = {}
+_sprites_lock = threading.Lock()
+
+# Function to get the geometry of the label background relative to the box corner at a given scale
+def _label_geometry(scale):
+    return {
+        "font_scale": FONT_SCALE * scale,
+        "font_thickness": max(1, round(FONT_THICKNESS * scale)),
+        "box_thickness": max(1, round(BOX_THICKNESS * scale)),
+        "offset": round(10 * scale),
+        "left": round(2 * scale),
+        "pad": round(4 * scale),
+    }
+
+# Function to render (once) the cyan label background with its black text
+def label_sprite(label, bucket, scale=1.0):
+    key = (label, bucket, scale)
+    sprite = _sprites.get(key)
+    if sprite is None:
+        geometry = _label_geometry(scale)
+        text = f"{label} ({bucket / 100:.2f})"
+        (text_w, text_h), _ = cv2.getTextSize(text, FONT, geometry["font_scale"], geometry["font_thickness"])
+        left, pad = geometry["left"], geometry["pad"]
+        sprite = np.empty((2 * text_h + 2 * pad + 1, text_w + left + pad + 1, 3), dtype=np.uint8)
+        sprite[:] = BOX_COLOR
+        cv2.putText(sprite, text, (left, text_h + pad), FONT, geometry["font_scale"], TEXT_COLOR,
+                    geometry["font_thickness"])
+        with _sprites_lock:
+            sprite = _sprites.setdefault(key, sprite)
+    return sprite
+
+# Function to paste a sprite with its top-left corner at (x, y), clipped to the canvas
+def _paste(canvas, sprite, x, y):
+    height, width = canvas.shape[:2]
+    x0, y0 = max(x, 0), max(y, 0)
+    x1, y1 = min(x + sprite.shape[1], width), min(y + sprite.shape[0], height)
+    if x0 < x1 and y0 < y1:
+        canvas[y0:y1, x0:x1] = sprite[y0 - y:y1 - y, x0 - x:x1 - x]
+
+# Function to snap a drawing scale to the nearest sprite scale step
+def sprite_scale(scale):
+    return max(1, min(SCALE_STEPS, round(scale * SCALE_STEPS))) / SCALE_STEPS
+
+# Function to draw detections straight from the box/confidence/class arrays. names maps class ids to
+# display labels. With display_width the image is first shrunk to that width and everything is drawn
+# at that scale, so full-resolution uploads are never copied at full size.
+def render_annotations(image, boxes, confidences, class_ids, names, display_width=None):
+    scale = 1.0
+    if display_width and image.shape[1] > display_width:
+        scale = display_width / image.shape[1]
+        height = max(1, round(image.shape[0] * scale))
+        canvas = cv2.resize(image, (display_width, height), interpolation=cv2.INTER_AREA)
+    else:
+        canvas = image.copy()
+    if len(boxes) == 0:
+        return canvas
+
+    snapped = sprite_scale(scale)
+    geometry = _label_geometry(snapped)
+    corners = np.asarray(boxes, dtype=np.float64).reshape(-1, 4) * scale
+    corners = corners.astype(np.int64)
+    buckets = np.rint(np.asarray(confidences, dtype=np.float64) * 100).astype(np.int64)
+    class_ids = np.asarray(class_ids).astype(np.int64)
+
+    for (x1, y1, x2, y2), bucket, class_id in zip(corners.tolist(), buckets.tolist(), class_ids.tolist()):
+        cv2.rectangle(canvas, (x1, y1), (x2, y2), BOX_COLOR, geometry["box_thickness"])
+        sprite = label_sprite(names[class_id], bucket, snapped)
+        text_h = (sprite.shape[0] - 1) // 2 - geometry["pad"]
+        _paste(canvas, sprite, x1 - geometry["left"], y1 - geometry["offset"] - text_h - geometry["pad"])
+    return canvas
@@ -0,0 +1,60 @@
+import os
+import shutil
+
+# Inference engines a weight file can run on. Exported models are loaded back through
+# ultralytics.YOLO, so every backend returns the same Results (boxes.data, names) as PyTorch.
+BACKENDS = ("pytorch", "onnx", "onnx-int8", "openvino", "openvino-int8")
+
+# Backend used when none is given, overridable from the environment
+DEFAULT_BACKEND = os.environ.get("LUMINA_BACKEND", "pytorch")
+
+# Function to get where the exported model for a backend lives (next to the .pt weights)
+def exported_path(weights, backend):
+    stem = os.path.splitext(weights)[0]
+    return {
+        "pytorch": weights,
+        "onnx": stem + ".onnx",
+        "onnx-int8": stem + ".int8.onnx",
+        "openvino": stem + "_openvino_model",
+        "openvino-int8": stem + "_int8_openvino_model",
+    }[backend]
+
+# Function to export the weights for a backend (once; later calls reuse the exported files).
+# data is the dataset YAML used to calibrate OpenVINO INT8 quantisation.
+def export(weights, backend, imgsz=640, data=None):
+    if backend not in BACKENDS:
+        raise ValueError(f"unknown backend {backend!r}, expected one of {', '.join(BACKENDS)}")
+    path = exported_path(weights, backend)
+    if os.path.exists(path):
+        return path
+
+    from ultralytics import YOLO
+
+    if backend == "onnx":
+        produced = YOLO(weights).export(format="onnx", imgsz=imgsz, dynamic=True)
+    elif backend == "onnx-int8":
+        try:
+            from onnxruntime.quantization import QuantType, quantize_dynamic
+        except ImportError as error:
+            raise RuntimeError("the onnx-int8 backend needs onnxruntime (pip install onnxruntime)") from error
+        quantize_dynamic(export(weights, "onnx", imgsz), path, weight_type=QuantType.QUInt8)
+        produced = path
+    elif backend == "openvino":
+        produced = YOLO(weights).export(format="openvino", imgsz=imgsz)
+    else:
+        if data is None:
+            raise ValueError("the openvino-int8 backend needs a calibration dataset YAML (data=...)")
+        produced = YOLO(weights).export(format="openvino", imgsz=imgsz, int8=True, data=data)
+
+    produced = str(produced)
+    if os.path.abspath(produced) != os.path.abspath(path):
+        shutil.move(produced, path)
+    return path
+
+# Function to load a weight file on the given backend, exporting it first if needed
+def load(weights, backend=DEFAULT_BACKEND, imgsz=640, data=None):
+    from ultralytics import YOLO
+
+    if backend == "pytorch":
+        return YOLO(weights)
+    return YOLO(export(weights, backend, imgsz, data), task="detect")
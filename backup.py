@@ -1,7 +1,7 @@
 import streamlit as st
 import cv2
 import numpy as np
-from ultralytics import YOLO
+import model_registry
 
 # Define the label map
 label_map = {
@@ -23,8 +23,8 @@ def main():
     st.title("Lumina Flora: Plant Growth Stage Detection Model")
     st.write("The plant growth stage detection model is a YOLOv8 Model that is capable of detecting plant growth stages: germination, growing, and harvesting.")
 
-    # Load your YOLOv8 model
-    model = YOLO("40 Epoch Plant Growth Stage YOLOv8 Model.pt")
+    # Load your YOLOv8 model (cached once per process)
+    model = model_registry.get_model()
     
     # Provide options for users to choose from
     option = st.selectbox("Select Level:", ["None", "Olmetie Lettuce", "Thurinus Lettuce"])
@@ -51,7 +51,7 @@ def main():
             # Detect growth stage button and results display
             if st.button("Detect Growth Stage"):
                 # Make predictions
-                results = model.predict(source=image, save=False, conf=0.25)  # Adjust confidence threshold as needed
+                results = model_registry.predict(image, save=False, conf=0.25)  # Adjust confidence threshold as needed
                 
                 # Initialize a list to store detection results
                 detection_results = []
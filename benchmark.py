@@ -0,0 +1,190 @@
+import argparse
+import json
+import platform
+import sys
+import time
+
+import cv2
+import numpy as np
+
+import backends
+import model_registry
+from pipeline import annotate_image, decode_reduced, encode_jpeg, parse_detections, preprocess, result_rows, thumbnail
+
+DEFAULT_RESOLUTIONS = "640x480,1920x1080,4000x3000"
+
+# Function to summarise a list of millisecond timings
+def summarize(stage, resolution, timings, items_per_run=1):
+    timings = np.asarray(timings, dtype=np.float64)
+    p50, p95, p99 = np.percentile(timings, [50, 95, 99])
+    return {
+        "stage": stage,
+        "resolution": resolution,
+        "runs": len(timings),
+        "mean_ms": round(float(timings.mean()), 3),
+        "p50_ms": round(float(p50), 3),
+        "p95_ms": round(float(p95), 3),
+        "p99_ms": round(float(p99), 3),
+        "throughput_per_s": round(items_per_run * 1000 / float(timings.mean()), 2) if timings.mean() else None,
+    }
+
+# Function to time repeated calls of fn (after one untimed warm-up call), returning the timings in
+# milliseconds and the last result
+def measure(fn, repeats):
+    timings, result = [], fn()
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings, result
+
+# Function to build the fixture uploads: the bundled image resized to each resolution and JPEG-encoded
+def make_fixtures(source_path, resolutions):
+    source = cv2.imread(source_path, cv2.IMREAD_COLOR)
+    if source is None:
+        raise ValueError(f"cannot read {source_path}")
+    fixtures = []
+    for resolution in resolutions:
+        width, height = map(int, resolution.split("x"))
+        image = cv2.resize(source, (width, height), interpolation=cv2.INTER_CUBIC)
+        fixtures.append((resolution, encode_jpeg(image, 95)))
+    return fixtures
+
+# Function to make stand-in detections when the model stage is skipped
+def synthetic_detections(image, count=50, seed=0):
+    rng = np.random.default_rng(seed)
+    height, width = image.shape[:2]
+    detections = []
+    for i in range(count):
+        x1, y1 = int(rng.integers(0, width - 20)), int(rng.integers(0, height - 20))
+        detections.append({'Label': ("Germination", "Growing", "Harvesting")[i % 3],
+                           'Confidence': round(float(rng.uniform(0.25, 1.0)), 2),
+                           'Bounding Box': (x1, y1, min(width, x1 + int(rng.integers(10, 200))),
+                                            min(height, y1 + int(rng.integers(10, 200))))})
+    return detections
+
+# Function to run every stage of the main.py flow over the fixtures
+def run(args):
+    results, model = [], None
+    if not args.skip_model:
+        start = time.perf_counter()
+        model = backends.load(args.weights, args.backend)
+        results.append(summarize("model_load", "-", [(time.perf_counter() - start) * 1000]))
+        start = time.perf_counter()
+        model.predict(source=np.zeros((640, 640, 3), dtype=np.uint8), save=False, verbose=False)
+        results.append(summarize("inference_first", "-", [(time.perf_counter() - start) * 1000]))
+
+    fixtures = make_fixtures(args.image, args.resolutions.split(","))
+    for resolution, data in fixtures:
+        timings, (image, _) = measure(lambda: decode_reduced(data), args.repeats)
+        results.append(summarize("decode", resolution, timings))
+        timings, preprocessed = measure(lambda: preprocess(image, "Thurinus Lettuce"), args.repeats)
+        results.append(summarize("preprocess_thurinus", resolution, timings))
+
+        if model is not None:
+            timings, predictions = measure(lambda: model.predict(source=preprocessed, save=False, conf=args.conf,
+                                                                 verbose=False), args.repeats)
+            results.append(summarize("inference_warm", resolution, timings))
+            detections, names = result_rows(predictions[0]), model.names
+        else:
+            detections, names = synthetic_detections(image), None
+
+        timings, annotated = measure(lambda: annotate_image(image, detections, args.display_width, names),
+                                     args.repeats)
+        results.append(summarize("annotation", resolution, timings))
+        timings, _ = measure(lambda: (encode_jpeg(annotated), encode_jpeg(thumbnail(image, args.display_width))),
+                             args.repeats)
+        results.append(summarize("display_encode", resolution, timings))
+
+        def end_to_end():
+            decoded, _ = decode_reduced(data)
+            preprocessed_image = preprocess(decoded, "Thurinus Lettuce")
+            if model is not None:
+                found = parse_detections(model.predict(source=preprocessed_image, save=False, conf=args.conf,
+                                                       verbose=False)[0], model.names)
+            else:
+                found = detections
+            return encode_jpeg(annotate_image(decoded, found, args.display_width))
+
+        timings, _ = measure(end_to_end, args.repeats)
+        results.append(summarize("end_to_end", resolution, timings))
+
+        if model is not None and args.batch_size > 1:
+            batch = [preprocessed] * args.batch_size
+            timings, _ = measure(lambda: model.predict(source=batch, save=False, conf=args.conf, verbose=False),
+                                 args.repeats)
+            results.append(summarize(f"inference_batch{args.batch_size}", resolution, timings, args.batch_size))
+    return results
+
+# Function to compare results with a baseline run; returns a list of human-readable regressions
+def find_regressions(results, baseline, threshold, limits):
+    regressions = []
+    previous = {(entry["stage"], entry["resolution"]): entry for entry in baseline.get("results", [])}
+    for entry in results:
+        old = previous.get((entry["stage"], entry["resolution"]))
+        allowed = threshold.get(entry["stage"], threshold["*"])
+        if old and entry["p50_ms"] > old["p50_ms"] * (1 + allowed / 100):
+            regressions.append(f"{entry['stage']} @ {entry['resolution']}: p50 {entry['p50_ms']:.1f} ms vs "
+                               f"baseline {old['p50_ms']:.1f} ms (> +{allowed:g}%)")
+        limit = limits.get(entry["stage"])
+        if limit is not None and entry["p50_ms"] > limit:
+            regressions.append(f"{entry['stage']} @ {entry['resolution']}: p50 {entry['p50_ms']:.1f} ms "
+                               f"over the {limit:g} ms limit")
+    return regressions
+
+# Function to parse repeated STAGE=VALUE options
+def parse_stage_values(values):
+    parsed = {}
+    for value in values or []:
+        stage, _, number = value.partition("=")
+        parsed[stage] = float(number)
+    return parsed
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the detection flow stage by stage.")
+    parser.add_argument("--image", default="bg.jpg", help="Fixture image, resized to each resolution")
+    parser.add_argument("--resolutions", default=DEFAULT_RESOLUTIONS, help="Comma-separated WIDTHxHEIGHT list")
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--batch-size", type=int, default=8, help="Batch size for the batched inference run")
+    parser.add_argument("--display-width", type=int, default=600)
+    parser.add_argument("--conf", type=float, default=0.25)
+    parser.add_argument("--weights", default=model_registry.MODEL_PATH)
+    parser.add_argument("--backend", default=backends.DEFAULT_BACKEND, choices=backends.BACKENDS)
+    parser.add_argument("--skip-model", action="store_true", help="Skip model stages (no ultralytics needed)")
+    parser.add_argument("--output", help="Write the results as JSON here")
+    parser.add_argument("--baseline", help="Earlier JSON results to check for regressions")
+    parser.add_argument("--threshold", type=float, default=20.0, help="Allowed p50 slowdown vs baseline, in %%")
+    parser.add_argument("--stage-threshold", action="append", metavar="STAGE=PCT",
+                        help="Per-stage override of --threshold (repeatable)")
+    parser.add_argument("--limit", action="append", metavar="STAGE=MS", help="Absolute p50 limit (repeatable)")
+    args = parser.parse_args(argv)
+
+    results = run(args)
+    print(f"{'stage':>20} {'resolution':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'per s':>8}")
+    for entry in results:
+        print(f"{entry['stage']:>20} {entry['resolution']:>10} {entry['p50_ms']:9.2f} {entry['p95_ms']:9.2f} "
+              f"{entry['p99_ms']:9.2f} {entry['throughput_per_s'] or 0:8.1f}")
+
+    report = {
+        "meta": {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+                 "opencv": cv2.__version__, "platform": platform.platform(), "backend": args.backend,
+                 "skip_model": args.skip_model, "repeats": args.repeats, "cv2_threads": cv2.getNumThreads()},
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+    threshold = dict(parse_stage_values(args.stage_threshold), **{"*": args.threshold})
+    regressions = find_regressions(results, baseline, threshold, parse_stage_values(args.limit))
+    for regression in regressions:
+        print(f"REGRESSION: {regression}", file=sys.stderr)
+    if regressions:
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
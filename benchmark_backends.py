@@ -0,0 +1,89 @@
+import argparse
+import os
+import time
+
+import cv2
+import numpy as np
+
+import backends
+import model_registry
+from pipeline import IMAGE_EXTENSIONS, parse_detections
+
+# Function to compute the intersection-over-union of two (x1, y1, x2, y2) boxes
+def iou(a, b):
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    intersection = max(0, x2 - x1) * max(0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - intersection
+    return intersection / union if union > 0 else 0.0
+
+# Function to greedily match candidate detections to the reference ones (same label, IoU >= threshold)
+def match(reference, candidate, threshold=0.5):
+    unmatched = sorted(candidate, key=lambda detection: -detection['Confidence'])
+    matched, confidence_diffs = 0, []
+    for ref in sorted(reference, key=lambda detection: -detection['Confidence']):
+        best = max((c for c in unmatched if c['Label'] == ref['Label']),
+                   key=lambda c: iou(ref['Bounding Box'], c['Bounding Box']), default=None)
+        if best is not None and iou(ref['Bounding Box'], best['Bounding Box']) >= threshold:
+            unmatched.remove(best)
+            matched += 1
+            confidence_diffs.append(abs(ref['Confidence'] - best['Confidence']))
+    return matched, confidence_diffs
+
+# Function to collect the sample images (a directory, or single files)
+def load_images(paths):
+    images = []
+    for path in paths:
+        names = sorted(os.path.join(path, name) for name in os.listdir(path)
+                       if name.lower().endswith(IMAGE_EXTENSIONS)) if os.path.isdir(path) else [path]
+        for name in names:
+            image = cv2.imread(name, cv2.IMREAD_COLOR)
+            if image is not None:
+                images.append((name, image))
+    return images
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare accuracy and latency of the inference backends.")
+    parser.add_argument("images", nargs="*", default=["bg.jpg"], help="Sample images or directories")
+    parser.add_argument("--backends", default="pytorch,onnx,onnx-int8,openvino",
+                        help=f"Comma-separated list from: {', '.join(backends.BACKENDS)}")
+    parser.add_argument("--weights", default=model_registry.MODEL_PATH)
+    parser.add_argument("--data", help="Calibration dataset YAML (needed for openvino-int8)")
+    parser.add_argument("--conf", type=float, default=0.25)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    images = load_images(args.images)
+    if not images:
+        parser.error("no readable sample images")
+
+    reference, baseline_ms = None, None
+    print(f"{'backend':>14} {'p50 ms':>8} {'p95 ms':>8} {'speedup':>8} {'precision':>10} {'recall':>8} {'|d conf|':>9}")
+    for backend in ["pytorch"] + [b for b in args.backends.split(",") if b != "pytorch"]:
+        model = backends.load(args.weights, backend, data=args.data)
+        model_registry.warm_up(model)
+        latencies, detections = [], []
+        for _, image in images:
+            for _ in range(args.repeats):
+                start = time.perf_counter()
+                results = model.predict(source=image, save=False, conf=args.conf, verbose=False)
+                latencies.append((time.perf_counter() - start) * 1000)
+            detections.append(parse_detections(results[0], model.names))
+
+        p50, p95 = np.percentile(latencies, [50, 95])
+        if reference is None:
+            reference, baseline_ms = detections, p50
+        matched, diffs, found, expected = 0, [], 0, 0
+        for ref, candidate in zip(reference, detections):
+            image_matched, image_diffs = match(ref, candidate)
+            matched += image_matched
+            diffs += image_diffs
+            found += len(candidate)
+            expected += len(ref)
+        precision = matched / found if found else 1.0
+        recall = matched / expected if expected else 1.0
+        print(f"{backend:>14} {p50:8.1f} {p95:8.1f} {baseline_ms / p50:7.2f}x {precision:10.3f} {recall:8.3f} "
+              f"{np.mean(diffs) if diffs else 0.0:9.3f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+import argparse
+import time
+
+import cv2
+import numpy as np
+
+from check_thurinus import check_equivalence, check_exhaustive
+from pipeline import preprocess_thurinus, preprocess_thurinus_batch, preprocess_thurinus_fast
+
+# Function to time a callable, returning the best of several runs in milliseconds
+def best_of(fn, repeats):
+    fn()
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - start) * 1000)
+    return min(timings)
+
+def main():
+    parser = argparse.ArgumentParser(description="Equivalence check and micro-benchmark for the Thurinus preprocessing.")
+    parser.add_argument("--image", default="bg.jpg", help="Source image, resized to each benchmark size")
+    parser.add_argument("--sizes", default="640x640,1920x1080,4000x3000", help="Comma-separated WIDTHxHEIGHT list")
+    parser.add_argument("--batch", type=int, default=8, help="Batch size for the batched run")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--exhaustive", action="store_true", help="Also check all 16.7M colours")
+    args = parser.parse_args()
+
+    source = cv2.imread(args.image, cv2.IMREAD_COLOR)
+    if source is None:
+        parser.error(f"cannot read {args.image}")
+
+    if args.exhaustive:
+        check_exhaustive()
+        print("exhaustive colour check: identical")
+
+    print(f"{'size':>10} {'reference ms':>13} {'fast ms':>8} {'prealloc ms':>12} {'speedup':>8} {'max diff':>9} {'tail diff':>10}")
+    for size in args.sizes.split(","):
+        width, height = map(int, size.split("x"))
+        image = cv2.resize(source, (width, height))
+        out = np.empty_like(image)
+        max_diff, tail_diff = check_equivalence(image)
+        reference_ms = best_of(lambda: preprocess_thurinus(image), args.repeats)
+        fast_ms = best_of(lambda: preprocess_thurinus_fast(image), args.repeats)
+        prealloc_ms = best_of(lambda: preprocess_thurinus_fast(image, out), args.repeats)
+        print(f"{size:>10} {reference_ms:13.1f} {fast_ms:8.1f} {prealloc_ms:12.1f} "
+              f"{reference_ms / prealloc_ms:7.2f}x {max_diff:9d} {tail_diff:10d}")
+
+    width, height = map(int, args.sizes.split(",")[0].split("x"))
+    batch = np.stack([cv2.resize(source, (width, height))] * args.batch)
+    batch_out = np.empty_like(batch)
+    reference_ms = best_of(lambda: [preprocess_thurinus(image) for image in batch], args.repeats)
+    batch_ms = best_of(lambda: preprocess_thurinus_batch(batch, batch_out), args.repeats)
+    print(f"batch of {args.batch} at {width}x{height}: reference {reference_ms:.1f} ms, "
+          f"batched {batch_ms:.1f} ms ({reference_ms / batch_ms:.2f}x)")
+
+if __name__ == '__main__':
+    main()
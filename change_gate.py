@@ -0,0 +1,141 @@
+import threading
+
+import cv2
+import numpy as np
+
+import metrics
+import model_registry
+from pipeline import detect_windows, preprocess, scale_detections, to_detections
+from tiling import merge_detections
+
+# Width of the grayscale thumbnail frames are compared on
+SIGNATURE_WIDTH = 64
+# Smallest side of a re-detected region, in pixels of the decoded image (smaller crops lose context)
+MIN_REGION_SIDE = 320
+
+# Function to compute a frame's change signature: a small grayscale thumbnail with its mean brightness removed,
+# so exposure drift between captures does not count as change. Takes encoded bytes (decoded at 1/8 scale,
+# far cheaper than a full decode) or an already decoded BGR image.
+def signature(data=None, image=None):
+    if image is None:
+        image = cv2.imdecode(np.frombuffer(data, dtype=np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_8)
+        if image is None:
+            return None
+    elif image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    height = max(1, round(SIGNATURE_WIDTH * image.shape[0] / image.shape[1]))
+    thumbnail = cv2.resize(image, (SIGNATURE_WIDTH, height), interpolation=cv2.INTER_AREA).astype(np.float32)
+    return thumbnail - thumbnail.mean()
+
+# Function to turn changed grid cells into padded, merged regions as (x1, y1, x2, y2) fractions of the frame
+def _changed_regions(changed):
+    rows, columns = changed.shape
+    regions = []
+    for row, column in zip(*np.nonzero(changed)):
+        # Pad each cell by half a cell so plants crossing a cell edge are seen whole
+        regions.append([max(0.0, (column - 0.5) / columns), max(0.0, (row - 0.5) / rows),
+                        min(1.0, (column + 1.5) / columns), min(1.0, (row + 1.5) / rows)])
+    merged = True
+    while merged:
+        merged = False
+        for i in range(len(regions)):
+            for j in range(i + 1, len(regions)):
+                a, b = regions[i], regions[j]
+                if a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]:
+                    regions[i] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+                    del regions[j]
+                    merged = True
+                    break
+            if merged:
+                break
+    return [tuple(map(float, region)) for region in regions]
+
+# Decides per source whether a frame needs inference, by comparing its signature with the last frame that was
+# actually processed from that source. The frame is split into a grid x grid set of cells; a cell has changed
+# when its mean absolute difference exceeds threshold (a fraction of the 0-255 range).
+#   "skip"     no cell changed: reuse the previous detections
+#   "regions"  at most max_region_fraction of the cells changed: re-detect only those regions
+#   "full"     anything else, or no processed frame yet
+class ChangeGate:
+    def __init__(self, threshold=0.03, grid=8, max_region_fraction=0.25):
+        self.threshold = threshold
+        self.grid = grid
+        self.max_region_fraction = max_region_fraction
+        self.references = {}
+        self.counts = {"skip": 0, "regions": 0, "full": 0}
+        self.lock = threading.Lock()
+
+    # Function to decide what to do with a frame; returns (decision, regions, previous detections)
+    def check(self, source, frame_signature):
+        with self.lock:
+            reference = self.references.get(source)
+        decision, regions, previous = "full", [], None
+        if (frame_signature is not None and reference is not None
+                and reference[0].shape == frame_signature.shape):
+            previous = reference[1]
+            cells = self._cell_changes(reference[0], frame_signature)
+            changed = cells > self.threshold
+            if not changed.any():
+                decision = "skip"
+            elif changed.mean() <= self.max_region_fraction:
+                decision, regions = "regions", _changed_regions(changed)
+        with self.lock:
+            self.counts[decision] += 1
+        metrics.increment("lumina_change_gate_frames_total", decision=decision)
+        return decision, regions, previous
+
+    def _cell_changes(self, reference, current):
+        difference = np.abs(current - reference) / 255.0
+        height, width = difference.shape
+        rows = np.linspace(0, height, self.grid + 1).astype(int)
+        columns = np.linspace(0, width, self.grid + 1).astype(int)
+        return np.add.reduceat(np.add.reduceat(difference, rows[:-1], axis=0), columns[:-1], axis=1) / \
+            np.outer(np.diff(rows), np.diff(columns)).clip(min=1)
+
+    # Function to make a processed frame the new reference for its source. With order (e.g. the capture time),
+    # a frame older than the current reference is ignored, so results finishing out of order never roll the
+    # reference back.
+    def update(self, source, frame_signature, detections, order=None):
+        if frame_signature is not None:
+            with self.lock:
+                reference = self.references.get(source)
+                if order is None or reference is None or reference[2] is None or order >= reference[2]:
+                    self.references[source] = (frame_signature, detections, order)
+
+    # Function to report how many frames were skipped, partly re-detected and fully processed
+    def stats(self):
+        with self.lock:
+            return dict(self.counts)
+
+# Function to re-detect only the changed regions of a frame and splice the results into the previous
+# detections. Regions are fractions of the frame; previous detections (original coordinates) centred inside a
+# changed region are replaced by what the model finds centred there now. Returns original-coordinate
+# detections.
+def refresh_regions(original_image, plant_type, regions, previous, scale, conf=0.25,
+                    weights=model_registry.MODEL_PATH, merge_threshold=0.5):
+    height, width = original_image.shape[:2]
+    windows = []
+    for x1, y1, x2, y2 in regions:
+        left, top = int(x1 * width), int(y1 * height)
+        right, bottom = int(np.ceil(x2 * width)), int(np.ceil(y2 * height))
+        # Grow small regions around their centre so the model sees enough context
+        grow_x, grow_y = max(0, MIN_REGION_SIDE - (right - left)), max(0, MIN_REGION_SIDE - (bottom - top))
+        left, right = max(0, left - grow_x // 2), min(width, right + grow_x - grow_x // 2)
+        top, bottom = max(0, top - grow_y // 2), min(height, bottom + grow_y - grow_y // 2)
+        windows.append((left, top, right, bottom))
+
+    image = preprocess(original_image, plant_type)
+    model_registry.record_use(weights)
+    rows = merge_detections(detect_windows(image, windows, conf, weights), merge_threshold)
+    found = scale_detections(to_detections(rows.tolist(), model_registry.get_model(weights).names), scale)
+
+    full_width, full_height = width * scale[0], height * scale[1]
+
+    def in_changed_region(detection):
+        x1, y1, x2, y2 = detection['Bounding Box']
+        centre_x, centre_y = (x1 + x2) / 2 / full_width, (y1 + y2) / 2 / full_height
+        return any(rx1 <= centre_x <= rx2 and ry1 <= centre_y <= ry2 for rx1, ry1, rx2, ry2 in regions)
+
+    kept = [{key: value for key, value in detection.items() if key != 'Settings'}
+            for detection in previous or [] if not in_changed_region(detection)]
+    return kept + [detection for detection in found if in_changed_region(detection)]
@@ -0,0 +1,81 @@
+import argparse
+import sys
+
+import cv2
+import numpy as np
+
+from pipeline import get_thurinus_tables, preprocess_thurinus, preprocess_thurinus_batch, preprocess_thurinus_fast
+
+# Widths around the usual SIMD block sizes (16, 32 and 64 pixels), so every row-tail length is covered,
+# plus common frame sizes
+WIDTHS = (1, 2, 7, 15, 16, 17, 31, 32, 33, 63, 64, 65, 333, 640, 1000, 1001, 1031, 1920, 4000, 4001)
+# Largest per-channel difference allowed between the fast path and the reference. OpenCV converts the last
+# (width % block) pixels of each row with scalar code that rounds differently from its vectorised code; the fast
+# path looks those columns up in a table built from the scalar path, so the tails are held to the same tolerance.
+TOLERANCE = 0
+ROW_TAIL_TOLERANCE = 0
+
+# Function to compare the fast path against the reference implementation, returning the largest difference in
+# the vectorised columns and in the row tails
+def check_equivalence(image):
+    expected = preprocess_thurinus(image)
+    actual = preprocess_thurinus_fast(image)
+    diff = np.abs(expected.astype(np.int16) - actual)
+    block = get_thurinus_tables()[2]
+    tail = image.shape[1] % block if block else image.shape[1]
+    body_diff = int(diff[:, :image.shape[1] - tail].max(initial=0))
+    tail_diff = int(diff[:, image.shape[1] - tail:].max(initial=0))
+    assert body_diff <= TOLERANCE, f"fast path differs from preprocess_thurinus by {body_diff} levels"
+    assert tail_diff <= ROW_TAIL_TOLERANCE, \
+        f"fast path differs from preprocess_thurinus by {tail_diff} levels in the row tail"
+    return body_diff, tail_diff
+
+# Function to check every 24-bit colour, once on rows OpenCV fully vectorises and once on single-pixel rows
+# (all scalar path)
+def check_exhaustive():
+    colours = np.arange(1 << 24, dtype=np.uint32)
+    image = np.stack([colours >> 16, colours >> 8, colours], axis=1).astype(np.uint8)
+    check_equivalence(image.reshape(4096, 4096, 3))
+    check_equivalence(image.reshape(1 << 24, 1, 3))
+
+# Function to check random images at every width in WIDTHS, single-threaded bands and the threaded path alike
+def check_widths(rng):
+    for width in WIDTHS:
+        for height in (1, 300):
+            check_equivalence(rng.integers(0, 256, (height, width, 3), dtype=np.uint8))
+
+# Function to check the batched path, into a fresh and a preallocated output
+def check_batch(rng):
+    batch = rng.integers(0, 256, (4, 120, 333, 3), dtype=np.uint8)
+    expected = np.stack([preprocess_thurinus(image) for image in batch])
+    assert np.array_equal(preprocess_thurinus_batch(batch), expected), "batched path differs"
+    assert np.array_equal(preprocess_thurinus_batch(batch, np.empty_like(batch)), expected), \
+        "batched path differs with a preallocated output"
+    assert all(np.array_equal(actual, wanted) for actual, wanted in
+               zip(preprocess_thurinus_batch(list(batch)), expected)), "batched path differs on a list"
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that the fast Thurinus preprocessing matches the reference.")
+    parser.add_argument("--image", default="bg.jpg", help="Also check this image (skipped when missing)")
+    parser.add_argument("--quick", action="store_true", help="Skip the check of all 16.7M colours")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    block = get_thurinus_tables()[2]
+    print(f"OpenCV {cv2.__version__}: SIMD block {block or 'none'} pixels, "
+          f"tolerance {TOLERANCE}, row-tail tolerance {ROW_TAIL_TOLERANCE}")
+    check_widths(rng)
+    print(f"random images at {len(WIDTHS)} widths: identical")
+    check_batch(rng)
+    print("batches: identical")
+    image = cv2.imread(args.image, cv2.IMREAD_COLOR)
+    if image is not None:
+        check_equivalence(image)
+        print(f"{args.image}: identical")
+    if not args.quick:
+        check_exhaustive()
+        print("all 16.7M colours: identical")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,192 @@
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+
+import backends
+import model_registry
+from history import HistoryStore
+from latency_budget import detect_budgeted
+from pipeline import (DECODE_MIN_SIDE, IMAGE_EXTENSIONS, TILED_DECODE_MIN_SIDE, annotate_image, decode_reduced,
+                      detect_image, detect_tiled, scale_detections, with_settings)
+from profiles import aggregate
+
+CSV_FIELDS = ["path", "label", "confidence", "x1", "y1", "x2", "y2",
+              "light_color", "light_intensity", "temperature", "error"]
+
+# Per-process settings, filled in by the pool initializer
+_worker = {}
+
+# Function to list every image under a directory in a stable order
+def iter_images(directory):
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        for name in sorted(files):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                yield os.path.join(root, name)
+
+# Function to set up one worker process with its own model copy
+def init_worker(options, threads):
+    cv2.setNumThreads(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+    _worker.update(options)
+    model_registry.set_backend(options["backend"])
+    for weights in options.get("preload") or [options["weights"]]:
+        model_registry.get_model(weights)
+
+# Function to run the detection flow on one image file inside a worker. A file that vanished or can't be read,
+# or a model error, becomes an error record for that file instead of ending the whole run.
+def process_path(path):
+    relative_path = os.path.relpath(path, _worker["input_dir"])
+    try:
+        return _process_path(path, relative_path)
+    except Exception as error:
+        return {"path": relative_path, "plant_type": _worker["plant_type"], "error": f"{type(error).__name__}: {error}"}
+
+def _process_path(path, relative_path):
+    start = time.perf_counter()
+    min_side = TILED_DECODE_MIN_SIDE if _worker["tile_size"] else DECODE_MIN_SIDE
+    with open(path, "rb") as f:
+        original_image, scale = decode_reduced(f.read(), min_side)
+    if original_image is None:
+        return {"path": relative_path, "plant_type": _worker["plant_type"], "error": "unreadable image"}
+
+    latency = None
+    if _worker["latency_budget"]:
+        detections, latency = detect_budgeted(original_image, _worker["plant_type"], _worker["latency_budget"],
+                                              _worker["conf"], start)
+    elif _worker["tile_size"]:
+        detections = detect_tiled(original_image, _worker["plant_type"], _worker["conf"], _worker["weights"],
+                                  _worker["tile_size"], _worker["tile_overlap"])
+    else:
+        detections = detect_image(original_image, _worker["plant_type"], _worker["conf"], _worker["weights"])
+
+    if _worker["annotate_dir"]:
+        output_path = os.path.join(_worker["annotate_dir"], relative_path)
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        cv2.imwrite(output_path, annotate_image(original_image, detections))
+
+    detections = scale_detections(detections, scale)
+    record = {"path": relative_path, "plant_type": _worker["plant_type"],
+              "detections": with_settings(_worker["plant_type"], detections),
+              "setpoint": aggregate(_worker["plant_type"], detections)}
+    if latency:
+        record["latency"] = latency
+    return record
+
+# Function to map over a pool in order while keeping only a bounded number of tasks in flight
+def bounded_map(pool, fn, items, max_pending):
+    pending = deque()
+    for item in items:
+        pending.append(pool.submit(fn, item))
+        if len(pending) >= max_pending:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+# Writes one JSON object per image
+class JsonlWriter:
+    def __init__(self, stream):
+        self.stream = stream
+
+    def write(self, record):
+        self.stream.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+# Writes one CSV row per detection (or one row per image without detections)
+class CsvWriter:
+    def __init__(self, stream):
+        self.writer = csv.DictWriter(stream, fieldnames=CSV_FIELDS)
+        self.writer.writeheader()
+
+    def write(self, record):
+        detections = record.get("detections") or [None]
+        for detection in detections:
+            row = {"path": record["path"], "error": record.get("error", "")}
+            if detection:
+                x1, y1, x2, y2 = detection["Bounding Box"]
+                row.update(label=detection["Label"], confidence=detection["Confidence"],
+                           x1=x1, y1=y1, x2=x2, y2=y2, **detection["Settings"])
+            self.writer.writerow(row)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run Lumina Flora growth stage detection over a directory of images.")
+    parser.add_argument("input_dir", help="Directory of images (searched recursively)")
+    parser.add_argument("--plant-type", required=True, choices=["Olmetie Lettuce", "Thurinus Lettuce"])
+    parser.add_argument("--output", default="-", help="Output file (.jsonl or .csv), '-' for stdout")
+    parser.add_argument("--format", choices=["jsonl", "csv"], help="Output format (default: from --output extension)")
+    parser.add_argument("--annotate-dir", help="Also write annotated images to this directory")
+    parser.add_argument("--conf", type=float, default=0.25, help="Confidence threshold")
+    parser.add_argument("--weights", help="YOLO weight file (default: from the models file for --plant-type)")
+    parser.add_argument("--tier", choices=model_registry.TIERS, help="Model size to use from the models file")
+    parser.add_argument("--backend", default=backends.DEFAULT_BACKEND, choices=backends.BACKENDS,
+                        help="Inference engine (exported next to the weights on first use)")
+    parser.add_argument("--tile-size", type=int, default=0,
+                        help="Sliced inference on tiles of this size for large images (0 = whole image)")
+    parser.add_argument("--tile-overlap", type=float, default=0.2, help="Overlap between neighbouring tiles")
+    parser.add_argument("--latency-budget", type=float, default=0,
+                        help="Target milliseconds per image; resolution and model tier adapt to meet it (0 = off)")
+    parser.add_argument("--history", help="Also record the detections in this history database (SQLite)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Number of worker processes")
+    parser.add_argument("--threads-per-worker", type=int, default=1, help="torch/OpenCV threads per worker")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    output_format = args.format or ("csv" if args.output.lower().endswith(".csv") else "jsonl")
+    options = {
+        "input_dir": args.input_dir,
+        "plant_type": args.plant_type,
+        "conf": args.conf,
+        "weights": args.weights or model_registry.resolve_weights(args.plant_type, args.tier),
+        "annotate_dir": args.annotate_dir,
+        "backend": args.backend,
+        "tile_size": args.tile_size,
+        "tile_overlap": args.tile_overlap,
+        "latency_budget": args.latency_budget / 1000,
+    }
+
+    if args.latency_budget:
+        # The budget may pick any tier of the plant type's model, so every tier is loaded up front
+        options["preload"] = sorted({options["weights"]} | {model_registry.resolve_weights(args.plant_type, tier)
+                                                             for tier in model_registry.tiers(args.plant_type)})
+
+    stream = sys.stdout if args.output == "-" else open(args.output, "w", newline="", encoding="utf-8")
+    writer = CsvWriter(stream) if output_format == "csv" else JsonlWriter(stream)
+    store = HistoryStore(args.history) if args.history else None
+    count, start = 0, time.perf_counter()
+    try:
+        with ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker,
+                                 initargs=(options, args.threads_per_worker)) as pool:
+            for record in bounded_map(pool, process_path, iter_images(args.input_dir), args.workers * 4):
+                writer.write(record)
+                if store and "detections" in record:
+                    # Each subdirectory is recorded as its own source (tray), timestamped by file modification time
+                    try:
+                        ts = os.path.getmtime(os.path.join(args.input_dir, record["path"]))
+                    except OSError:
+                        ts = None
+                    store.record(os.path.dirname(record["path"]) or ".", args.plant_type, record["detections"],
+                                 ts=ts, path=record["path"])
+                count += 1
+    finally:
+        if stream is not sys.stdout:
+            stream.close()
+        if store:
+            store.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"Processed {count} images in {elapsed:.1f}s ({count / elapsed if elapsed else 0:.1f} images/s)",
+          file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+import metrics
+
+# Process-wide executor settings, overridable from the environment
+DEFAULT_WORKERS = int(os.environ.get("LUMINA_INFERENCE_WORKERS", "1"))
+DEFAULT_THREADS = int(os.environ.get("LUMINA_INFERENCE_THREADS", "0")) or None
+DEFAULT_MAX_QUEUE = int(os.environ.get("LUMINA_INFERENCE_QUEUE", "64"))
+# Seconds a request may wait in the queue before the UI gives up on it
+QUEUE_TIMEOUT = float(os.environ.get("LUMINA_QUEUE_TIMEOUT", "120"))
+
+# Raised when the executor queue is full
+class QueueFull(Exception):
+    pass
+
+# One submitted job. position() tells the caller how many jobs will run before it; result() also adds the
+# stage timings measured on the worker to the caller's request timings.
+class Ticket:
+    def __init__(self, executor, priority, sequence, fn, args, kwargs):
+        self.executor = executor
+        self.priority = priority
+        self.sequence = sequence
+        self.call = (fn, args, kwargs)
+        self.future = Future()
+        self.enqueued = time.perf_counter()
+        self.timings = {}
+
+    def __lt__(self, other):
+        return (self.priority, self.sequence) < (other.priority, other.sequence)
+
+    # Function to get the number of queued jobs ahead of this one (0 once it is running or finished)
+    def position(self):
+        return self.executor.position(self)
+
+    def running(self):
+        return self.future.running()
+
+    def done(self):
+        return self.future.done()
+
+    # Function to withdraw the job if it has not started yet
+    def cancel(self):
+        return self.executor.cancel(self)
+
+    def result(self, timeout=None):
+        result = self.future.result(timeout)
+        metrics.add_request_timings(self.timings)
+        return result
+
+# Runs inference jobs from every Streamlit session on a fixed set of worker threads, in priority then
+# submission order (lower priority values first). The OpenCV and torch thread pools are sized once, so that
+# workers x threads matches the cores instead of every concurrent request spawning its own pools.
+class InferenceExecutor:
+    def __init__(self, workers=DEFAULT_WORKERS, threads=DEFAULT_THREADS, max_queue=DEFAULT_MAX_QUEUE):
+        self.workers = workers
+        self.threads = threads or max(1, (os.cpu_count() or 1) // workers)
+        self.max_queue = max_queue
+        self.queue = []
+        self.condition = threading.Condition()
+        self.sequence = itertools.count()
+        self.running = 0
+        self.completed = 0
+        self.waits = deque(maxlen=1000)
+        self.worker_threads = [threading.Thread(target=self._run, daemon=True) for _ in range(workers)]
+        for thread in self.worker_threads:
+            thread.start()
+
+    # Function to queue fn(*args, **kwargs); raises QueueFull instead of queueing without bound
+    def submit(self, fn, *args, priority=0, **kwargs):
+        with self.condition:
+            if len(self.queue) >= self.max_queue:
+                raise QueueFull()
+            ticket = Ticket(self, priority, next(self.sequence), fn, args, kwargs)
+            heapq.heappush(self.queue, ticket)
+            self.condition.notify()
+        return ticket
+
+    def position(self, ticket):
+        with self.condition:
+            if ticket.future.done() or ticket.future.running():
+                return 0
+            return sum(1 for other in self.queue if other < ticket)
+
+    def cancel(self, ticket):
+        with self.condition:
+            if ticket in self.queue:
+                self.queue.remove(ticket)
+                heapq.heapify(self.queue)
+            return ticket.future.cancel()
+
+    # Function to size the process-wide OpenCV and torch thread pools (idempotent, run by each worker)
+    def _configure_threads(self):
+        import cv2
+
+        cv2.setNumThreads(self.threads)
+        try:
+            import torch
+            torch.set_num_threads(self.threads)
+        except ImportError:
+            pass
+
+    def _run(self):
+        self._configure_threads()
+        while True:
+            with self.condition:
+                while not self.queue:
+                    self.condition.wait()
+                ticket = heapq.heappop(self.queue)
+                if not ticket.future.set_running_or_notify_cancel():
+                    continue
+                self.running += 1
+            wait = time.perf_counter() - ticket.enqueued
+            metrics.observe("lumina_queue_wait_seconds", wait)
+            fn, args, kwargs = ticket.call
+            metrics.begin_request()
+            try:
+                result = fn(*args, **kwargs)
+            except Exception as error:
+                ticket.timings = metrics.end_request()
+                ticket.future.set_exception(error)
+            else:
+                ticket.timings = metrics.end_request()
+                ticket.future.set_result(result)
+            with self.condition:
+                self.running -= 1
+                self.completed += 1
+                self.waits.append(wait)
+
+    # Function to report queue depth, busy workers and queue wait times
+    def stats(self):
+        with self.condition:
+            waits = sorted(self.waits)
+            return {"queued": len(self.queue), "running": self.running, "completed": self.completed,
+                    "wait_p50_s": waits[len(waits) // 2] if waits else 0.0,
+                    "wait_p95_s": waits[int(len(waits) * 0.95)] if waits else 0.0}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# Function to get the process-wide executor shared by every Streamlit session
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = InferenceExecutor()
+    return _executor
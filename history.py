@@ -0,0 +1,278 @@
+import argparse
+import atexit
+import json
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+
+from profiles import dominant_stage, stage_totals
+
+# Detection history database used by the apps; history is only recorded when this is set
+DEFAULT_PATH = os.environ.get("LUMINA_HISTORY_DB") or None
+
+# Rows are written by one background thread in transactions of up to this many images (or every FLUSH_SECONDS)
+BATCH_SIZE = 500
+FLUSH_SECONDS = 0.5
+# Buckets that are whole multiples of the rollup period are answered from the rollup table
+ROLLUP_SECONDS = 3600
+
+# Boxes live in `detections`; `images` holds one summary row per image (its dominant stage) for timelines;
+# `stage_rollup` keeps hourly counts per source and stage so long-range count queries never touch the boxes,
+# and each `sources` row keeps its image count and time span up to date so listing sources is a plain read.
+# Sources and stages are stored as small integer ids to keep the big tables and their indexes compact.
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS sources (
+    id INTEGER PRIMARY KEY,
+    name TEXT UNIQUE NOT NULL,
+    images INTEGER NOT NULL DEFAULT 0,
+    first_ts REAL,
+    last_ts REAL
+);
+CREATE TABLE IF NOT EXISTS stages (id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL);
+CREATE TABLE IF NOT EXISTS images (
+    id INTEGER PRIMARY KEY,
+    source_id INTEGER NOT NULL,
+    ts REAL NOT NULL,
+    plant_type TEXT NOT NULL,
+    path TEXT,
+    stage_id INTEGER,
+    detections INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS detections (
+    image_id INTEGER NOT NULL,
+    source_id INTEGER NOT NULL,
+    ts REAL NOT NULL,
+    stage_id INTEGER NOT NULL,
+    confidence REAL NOT NULL,
+    x1 INTEGER, y1 INTEGER, x2 INTEGER, y2 INTEGER
+);
+CREATE TABLE IF NOT EXISTS stage_rollup (
+    source_id INTEGER NOT NULL,
+    period INTEGER NOT NULL,
+    stage_id INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (source_id, period, stage_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS images_source_ts ON images (source_id, ts, stage_id);
+CREATE INDEX IF NOT EXISTS images_ts ON images (ts);
+CREATE INDEX IF NOT EXISTS detections_source_ts ON detections (source_id, ts, stage_id);
+CREATE INDEX IF NOT EXISTS detections_image ON detections (image_id);
+"""
+
+# Function to open a connection with the settings every history connection uses
+def _connect(path):
+    connection = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.execute("PRAGMA temp_store=MEMORY")
+    return connection
+
+# Function to add the per-source summary columns to a database created before they existed, filled in once
+# from the images table
+def _add_source_summaries(connection):
+    if "images" in {row[1] for row in connection.execute("PRAGMA table_info(sources)")}:
+        return
+    with connection:
+        connection.execute("ALTER TABLE sources ADD COLUMN images INTEGER NOT NULL DEFAULT 0")
+        connection.execute("ALTER TABLE sources ADD COLUMN first_ts REAL")
+        connection.execute("ALTER TABLE sources ADD COLUMN last_ts REAL")
+        connection.execute("UPDATE sources SET (images, first_ts, last_ts) = "
+                           "(SELECT COUNT(*), MIN(ts), MAX(ts) FROM images WHERE source_id = sources.id)")
+
+# Append-optimised detection history in SQLite (WAL mode). record() only queues; a background thread writes
+# the queued images in batched transactions, so callers never wait on the disk. Queries use their own
+# connection per thread and run concurrently with the writer.
+class HistoryStore:
+    def __init__(self, path, max_queue=10000):
+        self.path = path
+        connection = _connect(path)
+        connection.executescript(SCHEMA)
+        _add_source_summaries(connection)
+        self.source_ids = dict(connection.execute("SELECT name, id FROM sources"))
+        self.stage_ids = dict(connection.execute("SELECT name, id FROM stages"))
+        connection.close()
+        self.pending = queue.Queue(maxsize=max_queue)
+        self.local = threading.local()
+        self.written = 0
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    # Function to queue one image's detections (original-resolution boxes, label_map stages) for writing
+    def record(self, source, plant_type, detections, ts=None, path=None):
+        self.pending.put((source, plant_type, [(detection['Label'], detection['Confidence'],
+                                                detection['Bounding Box']) for detection in detections],
+                          dominant_stage(stage_totals(detections)[1]), time.time() if ts is None else ts, path))
+
+    # Function to wait until everything queued so far has been written
+    def flush(self):
+        self.pending.join()
+
+    # Function to flush and stop the writer
+    def close(self):
+        self.flush()
+        self.pending.put(None)
+        self.thread.join()
+
+    def _run(self):
+        connection = _connect(self.path)
+        stopping = False
+        while not stopping:
+            batch = [self.pending.get()]
+            deadline = time.monotonic() + FLUSH_SECONDS
+            while len(batch) < BATCH_SIZE and batch[-1] is not None:
+                try:
+                    batch.append(self.pending.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            stopping = batch[-1] is None
+            images = [item for item in batch if item is not None]
+            try:
+                if images:
+                    with connection:
+                        self._write(connection, images)
+                    self.written += len(images)
+            except sqlite3.Error as error:
+                print(f"history: dropped {len(images)} images: {error}", file=sys.stderr)
+            finally:
+                for _ in batch:
+                    self.pending.task_done()
+        connection.close()
+
+    def _id(self, connection, table, ids, name):
+        if name not in ids:
+            connection.execute(f"INSERT OR IGNORE INTO {table} (name) VALUES (?)", (name,))
+            ids[name] = connection.execute(f"SELECT id FROM {table} WHERE name = ?", (name,)).fetchone()[0]
+        return ids[name]
+
+    def _write(self, connection, images):
+        boxes, rollup, summaries = [], {}, {}
+        for source, plant_type, detections, stage, ts, path in images:
+            source_id = self._id(connection, "sources", self.source_ids, source)
+            count, first, last = summaries.get(source_id, (0, ts, ts))
+            summaries[source_id] = (count + 1, min(first, ts), max(last, ts))
+            stage_id = self._id(connection, "stages", self.stage_ids, stage) if stage else None
+            image_id = connection.execute(
+                "INSERT INTO images (source_id, ts, plant_type, path, stage_id, detections) VALUES (?, ?, ?, ?, ?, ?)",
+                (source_id, ts, plant_type, path, stage_id, len(detections))).lastrowid
+            period = int(ts // ROLLUP_SECONDS) * ROLLUP_SECONDS
+            for label, confidence, (x1, y1, x2, y2) in detections:
+                label_id = self._id(connection, "stages", self.stage_ids, label)
+                boxes.append((image_id, source_id, ts, label_id, confidence, x1, y1, x2, y2))
+                rollup[source_id, period, label_id] = rollup.get((source_id, period, label_id), 0) + 1
+        connection.executemany("INSERT INTO detections VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", boxes)
+        connection.executemany(
+            "INSERT INTO stage_rollup VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (source_id, period, stage_id) DO UPDATE SET count = count + excluded.count",
+            [key + (count,) for key, count in rollup.items()])
+        connection.executemany(
+            "UPDATE sources SET images = images + ?, first_ts = MIN(COALESCE(first_ts, ?), ?), "
+            "last_ts = MAX(COALESCE(last_ts, ?), ?) WHERE id = ?",
+            [(count, first, first, last, last, source_id) for source_id, (count, first, last) in summaries.items()])
+
+    def _reader(self):
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = self.local.connection = _connect(self.path)
+        return connection
+
+    # Function to list the recorded sources with their image counts and time span
+    def sources(self):
+        return [{"source": name, "images": images, "first": first, "last": last}
+                for name, images, first, last in self._reader().execute(
+                    "SELECT name, images, first_ts, last_ts FROM sources WHERE images > 0 ORDER BY name")]
+
+    def _filters(self, source, start, end):
+        clauses, parameters = [], []
+        if source is not None:
+            clauses.append("source_id = (SELECT id FROM sources WHERE name = ?)")
+            parameters.append(source)
+        if start is not None:
+            clauses.append("{ts} >= ?")
+            parameters.append(start)
+        if end is not None:
+            clauses.append("{ts} < ?")
+            parameters.append(end)
+        return " AND ".join(clauses) or "1", parameters
+
+    # Function to count detections per stage in time buckets of `bucket` seconds. Buckets that are whole hours
+    # are read from the hourly rollup (its range is widened to whole hours); shorter ones scan the box index.
+    def stage_counts(self, source=None, start=None, end=None, bucket=ROLLUP_SECONDS):
+        bucket = int(bucket)
+        if bucket % ROLLUP_SECONDS == 0:
+            table, ts, count = "stage_rollup", "period", "SUM(count)"
+            start = None if start is None else start // ROLLUP_SECONDS * ROLLUP_SECONDS
+        else:
+            table, ts, count = "detections", "ts", "COUNT(*)"
+        where, parameters = self._filters(source, start, end)
+        rows = self._reader().execute(
+            f"SELECT CAST({ts} / ? AS INTEGER) * ? AS bucket, stage_id, {count} FROM {table} "
+            f"WHERE {where.format(ts=ts)} GROUP BY bucket, stage_id ORDER BY bucket",
+            [bucket, bucket] + parameters)
+        names = self._stage_names()
+        return [{"time": bucket_start, "stage": names[stage_id], "count": value}
+                for bucket_start, stage_id, value in rows]
+
+    def _stage_names(self):
+        return {stage_id: name for stage_id, name in self._reader().execute("SELECT id, name FROM stages")}
+
+    # Function to list the moments a source's dominant growth stage changed (its first image counts as one)
+    def stage_transitions(self, source, start=None, end=None):
+        where, parameters = self._filters(source, start, end)
+        rows = self._reader().execute(
+            "SELECT ts, stage, previous FROM ("
+            "  SELECT ts, stage_id AS stage, LAG(stage_id) OVER (ORDER BY ts) AS previous FROM images"
+            f"  WHERE {where.format(ts='ts')} AND stage_id IS NOT NULL"
+            ") WHERE previous IS NULL OR previous != stage ORDER BY ts", parameters)
+        names = self._stage_names()
+        return [{"time": ts, "stage": names[stage], "from": names.get(previous)} for ts, stage, previous in rows]
+
+_store = None
+_store_lock = threading.Lock()
+
+# Function to get the process-wide history store (None when LUMINA_HISTORY_DB is not set)
+def get_store(path=DEFAULT_PATH):
+    global _store
+    if not path:
+        return None
+    with _store_lock:
+        if _store is None:
+            _store = HistoryStore(path)
+            atexit.register(_store.close)
+    return _store
+
+# Function to parse a time given as unix seconds or an ISO date/time (local time)
+def parse_time(value):
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return time.mktime(time.strptime(value, "%Y-%m-%dT%H:%M" if "T" in value else "%Y-%m-%d"))
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Query the detection history.")
+    parser.add_argument("query", choices=["sources", "counts", "transitions"])
+    parser.add_argument("--db", default=DEFAULT_PATH or "history.db", help="History database (LUMINA_HISTORY_DB)")
+    parser.add_argument("--source", help="Source (camera/tray directory) to query")
+    parser.add_argument("--since", help="Start time (unix seconds, YYYY-MM-DD or YYYY-MM-DDTHH:MM)")
+    parser.add_argument("--until", help="End time (same formats as --since)")
+    parser.add_argument("--bucket", type=int, default=ROLLUP_SECONDS, help="Bucket size in seconds for counts")
+    args = parser.parse_args(argv)
+
+    store = HistoryStore(args.db)
+    if args.query == "sources":
+        rows = store.sources()
+    elif args.query == "counts":
+        rows = store.stage_counts(args.source, parse_time(args.since), parse_time(args.until), args.bucket)
+    else:
+        if not args.source:
+            parser.error("transitions needs --source")
+        rows = store.stage_transitions(args.source, parse_time(args.since), parse_time(args.until))
+    for row in rows:
+        print(json.dumps(row))
+
+if __name__ == '__main__':
+    main()
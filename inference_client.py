@@ -0,0 +1,36 @@
+import json
+import os
+import time
+import urllib.error
+import urllib.request
+from urllib.parse import urlencode
+
+# Base URL of the inference service; when unset the apps run inference in-process
+INFERENCE_URL = os.environ.get("LUMINA_INFERENCE_URL") or None
+
+# Raised when the service cannot answer (after retrying 429/503 responses)
+class InferenceUnavailable(Exception):
+    pass
+
+# Function to send image bytes to the inference service and return its detections (original-resolution
+# boxes, each with its Settings). 429/503 answers are retried after the server's Retry-After delay.
+def detect_remote(data, plant_type, conf=0.25, url=INFERENCE_URL, timeout=60.0, retries=3):
+    request_url = f"{url.rstrip('/')}/detect?{urlencode({'plant_type': plant_type, 'conf': conf})}"
+    for attempt in range(retries + 1):
+        request = urllib.request.Request(request_url, data=data, method="POST",
+                                         headers={"Content-Type": "application/octet-stream"})
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                payload = json.load(response)
+            break
+        except urllib.error.HTTPError as error:
+            if error.code not in (429, 503) or attempt == retries:
+                raise InferenceUnavailable(f"inference service answered {error.code}") from error
+            time.sleep(float(error.headers.get("Retry-After", "1")))
+        except urllib.error.URLError as error:
+            raise InferenceUnavailable(f"inference service unreachable: {error.reason}") from error
+
+    detections = payload["detections"]
+    for detection in detections:
+        detection['Bounding Box'] = tuple(detection['Bounding Box'])
+    return detections
@@ -0,0 +1,214 @@
+import argparse
+import json
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import backends
+import metrics
+import model_registry
+from pipeline import decode_reduced, detect_batch, preprocess, scale_detections, with_settings
+from profiles import aggregate
+
+PLANT_TYPES = ("Olmetie Lettuce", "Thurinus Lettuce")
+
+# Raised when the batch queue is full (HTTP 429)
+class QueueFull(Exception):
+    pass
+
+# One queued image waiting for a batch slot
+class _Job:
+    def __init__(self, image, conf):
+        self.image = image
+        self.conf = conf
+        self.future = Future()
+        self.enqueued = time.perf_counter()
+
+# Groups concurrent requests into micro-batches: a batch closes when it holds max_batch images or when
+# the oldest image has waited max_wait seconds, whichever comes first
+class MicroBatcher:
+    def __init__(self, max_batch=8, max_wait=0.01, max_queue=64, weights=model_registry.MODEL_PATH):
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.weights = weights
+        self.jobs = queue.Queue(maxsize=max_queue)
+        self.batches = 0
+        self.images = 0
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    # Function to queue a preprocessed image; raises QueueFull instead of blocking when saturated
+    def submit(self, image, conf):
+        job = _Job(image, conf)
+        try:
+            self.jobs.put_nowait(job)
+        except queue.Full:
+            raise QueueFull() from None
+        return job.future
+
+    def _collect(self):
+        batch = [self.jobs.get()]
+        deadline = batch[0].enqueued + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self.jobs.get(timeout=remaining) if remaining > 0 else self.jobs.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            # model.predict takes one threshold per call, so split the batch by confidence
+            by_conf = {}
+            for job in batch:
+                by_conf.setdefault(job.conf, []).append(job)
+            for conf, jobs in by_conf.items():
+                jobs = [job for job in jobs if job.future.set_running_or_notify_cancel()]
+                if not jobs:
+                    continue
+                try:
+                    detections = detect_batch([job.image for job in jobs], conf=conf,
+                                              batch_size=len(jobs), weights=self.weights)
+                except Exception as error:
+                    for job in jobs:
+                        job.future.set_exception(error)
+                    continue
+                for job, job_detections in zip(jobs, detections):
+                    job.future.set_result(job_detections)
+                self.batches += 1
+                self.images += len(jobs)
+
+    # Function to report queue depth and batching efficiency
+    def stats(self):
+        return {"queue_depth": self.jobs.qsize(), "batches": self.batches, "images": self.images,
+                "mean_batch": self.images / self.batches if self.batches else 0.0}
+
+class InferenceHandler(BaseHTTPRequestHandler):
+    server_version = "LuminaFlora/1.0"
+
+    def _send_json(self, status, payload, headers=()):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        if path == "/metrics":
+            body = metrics.render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+        elif path == "/health":
+            self._send_json(200, dict(status="ok", **self.server.batcher.stats()))
+        else:
+            self._send_json(404, {"error": "not found"})
+
+    # POST /detect?plant_type=Olmetie+Lettuce&conf=0.25 with the raw image bytes as the body
+    def do_POST(self):
+        url = urlparse(self.path)
+        if url.path != "/detect":
+            self._send_json(404, {"error": "not found"})
+            return
+
+        query = parse_qs(url.query)
+        plant_type = query.get("plant_type", [""])[0]
+        if plant_type not in PLANT_TYPES:
+            self._send_json(400, {"error": f"plant_type must be one of {', '.join(PLANT_TYPES)}"})
+            return
+        try:
+            conf = float(query.get("conf", ["0.25"])[0])
+            length = int(self.headers.get("Content-Length", "0"))
+        except ValueError:
+            self._send_json(400, {"error": "invalid conf or Content-Length"})
+            return
+        if length <= 0 or length > self.server.max_body:
+            self._send_json(413 if length > 0 else 400, {"error": "missing or oversized image body"})
+            return
+
+        # Bounded concurrency: refuse rather than pile up decoders when every slot is busy
+        if not self.server.slots.acquire(blocking=False):
+            self._send_json(503, {"error": "server saturated"}, [("Retry-After", "1")])
+            return
+        try:
+            start = time.perf_counter()
+            image, scale = decode_reduced(self.rfile.read(length))
+            if image is None:
+                self._send_json(400, {"error": "unreadable image"})
+                return
+            try:
+                future = self.server.batcher.submit(preprocess(image, plant_type), conf)
+            except QueueFull:
+                self._send_json(429, {"error": "inference queue full"}, [("Retry-After", "1")])
+                return
+            del image
+            try:
+                detections = future.result(timeout=self.server.request_timeout)
+            except FutureTimeoutError:
+                future.cancel()
+                self._send_json(503, {"error": "inference timed out"}, [("Retry-After", "1")])
+                return
+            except Exception as error:
+                self._send_json(500, {"error": str(error)})
+                return
+            detections = with_settings(plant_type, scale_detections(detections, scale))
+            self._send_json(200, {"plant_type": plant_type, "detections": detections,
+                                  "setpoint": aggregate(plant_type, detections),
+                                  "elapsed_ms": round((time.perf_counter() - start) * 1000, 1)})
+        finally:
+            self.server.slots.release()
+
+    def log_message(self, format, *args):
+        pass
+
+# Function to build the HTTP server around a micro-batcher
+def make_server(host="127.0.0.1", port=8000, max_batch=8, max_wait=0.01, max_queue=64, max_inflight=32,
+                timeout=30.0, max_body=64 << 20, weights=model_registry.MODEL_PATH):
+    server = ThreadingHTTPServer((host, port), InferenceHandler)
+    server.daemon_threads = True
+    server.batcher = MicroBatcher(max_batch, max_wait, max_queue, weights)
+    server.slots = threading.BoundedSemaphore(max_inflight)
+    server.request_timeout = timeout
+    server.max_body = max_body
+    return server
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve growth stage detection over HTTP with micro-batching.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--max-batch", type=int, default=8, help="Largest micro-batch per model.predict call")
+    parser.add_argument("--max-wait-ms", type=float, default=10.0, help="Longest a request waits for a batch to fill")
+    parser.add_argument("--max-queue", type=int, default=64, help="Queued images before answering 429")
+    parser.add_argument("--max-inflight", type=int, default=32, help="Concurrent requests before answering 503")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Seconds before a queued request gets 503")
+    parser.add_argument("--weights", default=model_registry.MODEL_PATH, help="YOLO weight file")
+    parser.add_argument("--backend", default=backends.DEFAULT_BACKEND, choices=backends.BACKENDS)
+    args = parser.parse_args(argv)
+
+    model_registry.set_backend(args.backend)
+    metrics.start_exporters_from_env()
+    model_registry.get_model(args.weights)
+    server = make_server(args.host, args.port, args.max_batch, args.max_wait_ms / 1000, args.max_queue,
+                         args.max_inflight, args.timeout, weights=args.weights)
+    print(f"Serving on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == '__main__':
+    main()
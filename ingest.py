@@ -0,0 +1,373 @@
+import argparse
+import json
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+import backends
+import metrics
+import model_registry
+from change_gate import ChangeGate, refresh_regions, signature
+from cli import JsonlWriter, init_worker
+from history import HistoryStore
+from pipeline import IMAGE_EXTENSIONS, decode_reduced, detect_image, scale_detections, with_settings
+from profiles import aggregate
+
+PLANT_TYPES = ("Olmetie Lettuce", "Thurinus Lettuce")
+POLICIES = ("block", "drop-oldest")
+
+# Function to run the detection flow on one captured file inside a worker; with regions, only those parts
+# of the frame are re-detected and spliced into the previous detections
+def process_file(path, plant_type, conf, weights, regions=None, previous=None):
+    with open(path, "rb") as f:
+        original_image, scale = decode_reduced(f.read())
+    if original_image is None:
+        return {"error": "unreadable image"}
+    if regions:
+        detections = refresh_regions(original_image, plant_type, regions, previous, scale, conf, weights)
+    else:
+        detections = scale_detections(detect_image(original_image, plant_type, conf, weights), scale)
+    return {"detections": with_settings(plant_type, detections), "setpoint": aggregate(plant_type, detections)}
+
+# Persisted progress: per source, a watermark (files modified before it are done) plus the done files at or
+# after it, and the late files: still pending although modified before the watermark. Files are handled in
+# modification-time order per source, so these sets stay small. The state only answers for files found when a
+# directory is first listed after a (re)start; while running, the scheduler remembers what it has seen, so a
+# file that shows up late with an older modification time (copied in, or uploaded with its capture time) is
+# still processed.
+class Checkpoint:
+    def __init__(self, path):
+        self.path = path
+        self.sources = {}
+        if path and os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for source, state in json.load(f).items():
+                    self.sources[source] = {"watermark": state["watermark"], "done": dict(state["done"]),
+                                            "late": set(state.get("late", ()))}
+
+    # Function to check whether a file was already processed (or dropped)
+    def is_done(self, source, path, mtime):
+        state = self.sources.get(source)
+        return state is not None and path not in state["late"] and (mtime < state["watermark"]
+                                                                    or path in state["done"])
+
+    def mark_done(self, source, path, mtime):
+        self.sources.setdefault(source, {"watermark": 0, "done": {}, "late": set()})["done"][path] = mtime
+
+    # Function to advance each watermark to the oldest still-pending file and write the state atomically.
+    # pending maps each source to its {path: mtime} of files found but not finished yet.
+    def save(self, pending):
+        for source, state in self.sources.items():
+            files = pending.get(source) or {}
+            if files:
+                state["watermark"] = max(state["watermark"], min(files.values()))
+            elif state["done"]:
+                state["watermark"] = max(state["watermark"], max(state["done"].values()))
+            state["done"] = {path: mtime for path, mtime in state["done"].items() if mtime >= state["watermark"]}
+            state["late"] = {path for path, mtime in files.items() if mtime < state["watermark"]}
+        if not self.path:
+            return
+        temporary = self.path + ".tmp"
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump({source: dict(state, late=sorted(state["late"])) for source, state in self.sources.items()}, f)
+        os.replace(temporary, self.path)
+
+# Schedules captured files fairly across sources (one directory per camera or tray). Each source has its own
+# FIFO of at most max_pending files, served round-robin. When a source's queue is full, "block" leaves new
+# files on disk until there is room (backpressure on the scanner); "drop-oldest" skips the stalest queued
+# file so results stay current. With serial, a source has at most one file in flight at a time (the change gate
+# needs each frame's predecessor finished before it can compare against it); sources still run in parallel.
+class IngestScheduler:
+    def __init__(self, roots, checkpoint, max_pending=32, policy="block", settle=2.0, serial=False):
+        if policy not in POLICIES:
+            raise ValueError(f"unknown policy {policy!r}, expected one of {', '.join(POLICIES)}")
+        self.roots = roots
+        self.checkpoint = checkpoint
+        self.max_pending = max_pending
+        self.policy = policy
+        self.settle = settle
+        self.serial = serial
+        self.busy = set()
+        self.queues = {}
+        self.plant_types = {}
+        self.rotation = deque()
+        self.in_flight = {}
+        # Per directory: its modification time, image names and subdirectories at the last listing
+        self.directories = {}
+        # Per source: files found but not queued yet (still settling, or held back by the "block" policy)
+        self.waiting = {}
+        self.processed = 0
+        self.failed = 0
+        self.skipped = 0
+        self.dropped = 0
+        self.lags = deque(maxlen=1000)
+
+    # Function to find new, fully written files and queue them by source in modification-time order. Only
+    # directories whose modification time changed (a file was added, renamed or removed) are listed again, and
+    # only their new files are stat'ed, so a scan costs one stat per directory plus the files still waiting.
+    def scan(self):
+        now = time.time()
+        for root, plant_type in self.roots.items():
+            self._scan_directory(root, plant_type, now)
+        for source, waiting in self.waiting.items():
+            ready = []
+            for path, mtime in list(waiting.items()):
+                # Skip files a camera may still be writing
+                if now - mtime / 1e9 < self.settle:
+                    try:
+                        mtime = waiting[path] = os.stat(path).st_mtime_ns
+                    except OSError:
+                        del waiting[path]
+                        continue
+                    if now - mtime / 1e9 < self.settle:
+                        continue
+                ready.append((mtime, path))
+            for mtime, path in sorted(ready):
+                if not self._enqueue(source, path, mtime):
+                    break
+                del waiting[path]
+
+    # Function to pick up the new image files of one directory tree, moving them to the waiting files
+    def _scan_directory(self, directory, plant_type, now):
+        try:
+            mtime = os.stat(directory).st_mtime_ns
+        except OSError:
+            self.directories.pop(directory, None)
+            return
+        state = self.directories.get(directory)
+        # A directory changed within the settle time is listed again: its timestamp may be too coarse to show a
+        # file added right after the last listing
+        if state is None or state["mtime"] != mtime or now - mtime / 1e9 < self.settle:
+            first = state is None
+            names, subdirectories = set(), []
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_dir():
+                            subdirectories.append(entry.path)
+                        elif entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                            names.add(entry.name)
+            except OSError:
+                return
+            known = set() if first else state["names"]
+            waiting = self.waiting.setdefault(directory, {})
+            for name in names - known:
+                path = os.path.join(directory, name)
+                try:
+                    file_mtime = os.stat(path).st_mtime_ns
+                except OSError:
+                    names.discard(name)
+                    continue
+                if first and self.checkpoint.is_done(directory, path, file_mtime):
+                    continue
+                waiting[path] = file_mtime
+                self.plant_types[directory] = plant_type
+            state = self.directories[directory] = {"mtime": mtime, "names": names,
+                                                   "subdirectories": sorted(subdirectories)}
+        for subdirectory in state["subdirectories"]:
+            self._scan_directory(subdirectory, plant_type, now)
+
+    def _enqueue(self, source, path, mtime):
+        queue = self.queues.get(source)
+        if queue is None:
+            queue = self.queues[source] = deque()
+            self.rotation.append(source)
+        if len(queue) >= self.max_pending:
+            if self.policy == "block":
+                return False
+            _, stale_path, stale_mtime = queue.popleft()
+            self.checkpoint.mark_done(source, stale_path, stale_mtime)
+            self.dropped += 1
+            metrics.increment("lumina_ingest_files_total", source=source, status="dropped")
+        queue.append((source, path, mtime))
+        return True
+
+    # Function to take the next file, round-robin across sources with queued files (None when all are empty)
+    def next_item(self):
+        for _ in range(len(self.rotation)):
+            source = self.rotation[0]
+            self.rotation.rotate(-1)
+            if self.queues[source] and source not in self.busy:
+                item = self.queues[source].popleft()
+                if self.serial:
+                    self.busy.add(source)
+                self.in_flight[item[1]] = item
+                return item
+        return None
+
+    # Function to record a finished file (status processed, skipped or failed); returns its lag from capture to
+    # result in seconds
+    def complete(self, item, status="processed"):
+        source, path, mtime = item
+        del self.in_flight[path]
+        self.busy.discard(source)
+        self.checkpoint.mark_done(source, path, mtime)
+        lag = time.time() - mtime / 1e9
+        self.lags.append(lag)
+        setattr(self, status, getattr(self, status) + 1)
+        metrics.increment("lumina_ingest_files_total", source=source, status=status)
+        metrics.observe("lumina_ingest_lag_seconds", lag)
+        return lag
+
+    # Function to get the files found but not finished yet, as {source: {path: mtime}} (for the checkpoint)
+    def pending_files(self):
+        pending = {}
+        for source, path, mtime in list(self.in_flight.values()) + [item for queue in self.queues.values()
+                                                                     for item in queue]:
+            pending.setdefault(source, {})[path] = mtime
+        for source, waiting in self.waiting.items():
+            pending.setdefault(source, {}).update(waiting)
+        return pending
+
+    # Function to report queue depth and lag
+    def stats(self):
+        now = time.time()
+        oldest = min((mtime for files in self.pending_files().values() for mtime in files.values()), default=None)
+        lags = sorted(self.lags)
+        for source, queue in self.queues.items():
+            metrics.set_gauge("lumina_ingest_queue_depth", len(queue), source=source)
+        metrics.set_gauge("lumina_ingest_in_flight", len(self.in_flight))
+        return {
+            "queue_depth": sum(len(queue) for queue in self.queues.values()),
+            "per_source": {source: len(queue) for source, queue in self.queues.items() if queue},
+            "waiting": sum(len(waiting) for waiting in self.waiting.values()),
+            "in_flight": len(self.in_flight),
+            "processed": self.processed,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "dropped": self.dropped,
+            "oldest_pending_s": round(now - oldest / 1e9, 1) if oldest is not None else 0.0,
+            "lag_p50_s": round(lags[len(lags) // 2], 1) if lags else 0.0,
+            "lag_max_s": round(lags[-1], 1) if lags else 0.0,
+        }
+
+# Function to parse repeated DIR=PLANT_TYPE options
+def parse_watch(values):
+    roots = {}
+    for value in values:
+        directory, _, plant_type = value.rpartition("=")
+        if not directory or plant_type not in PLANT_TYPES:
+            raise argparse.ArgumentTypeError(f"--watch needs DIR=PLANT_TYPE with one of {', '.join(PLANT_TYPES)}")
+        roots[directory] = plant_type
+    return roots
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Watch capture directories and run growth stage detection on new images.")
+    parser.add_argument("--watch", action="append", required=True, metavar="DIR=PLANT_TYPE",
+                        help="Directory to watch (recursively; each subdirectory is one camera/tray source)")
+    parser.add_argument("--output", default="ingest.jsonl", help="JSONL file the results are appended to")
+    parser.add_argument("--checkpoint", default="ingest-checkpoint.json", help="Progress file for restarts")
+    parser.add_argument("--policy", choices=POLICIES, default="block", help="What to do when a source falls behind")
+    parser.add_argument("--max-pending", type=int, default=32, help="Queued files per source before the policy applies")
+    parser.add_argument("--interval", type=float, default=2.0, help="Seconds between directory scans")
+    parser.add_argument("--settle", type=float, default=2.0, help="Seconds a file must be unmodified before it is read")
+    parser.add_argument("--report-interval", type=float, default=30.0, help="Seconds between status lines")
+    parser.add_argument("--change-threshold", type=float, default=0.0,
+                        help="Reuse the last results for frames that changed less than this (0 = always detect)")
+    parser.add_argument("--history", help="Also record the detections in this history database (SQLite)")
+    parser.add_argument("--conf", type=float, default=0.25, help="Confidence threshold")
+    parser.add_argument("--weights", help="YOLO weight file (default: from the models file for each plant type)")
+    parser.add_argument("--tier", choices=model_registry.TIERS, help="Model size to use from the models file")
+    parser.add_argument("--backend", default=backends.DEFAULT_BACKEND, choices=backends.BACKENDS)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Number of worker processes")
+    parser.add_argument("--threads-per-worker", type=int, default=1, help="torch/OpenCV threads per worker")
+    args = parser.parse_args(argv)
+    try:
+        roots = parse_watch(args.watch)
+    except argparse.ArgumentTypeError as error:
+        parser.error(str(error))
+
+    metrics.start_exporters_from_env()
+    checkpoint = Checkpoint(args.checkpoint)
+    gate = ChangeGate(args.change_threshold) if args.change_threshold > 0 else None
+    scheduler = IngestScheduler(roots, checkpoint, args.max_pending, args.policy, args.settle, serial=gate is not None)
+    store = HistoryStore(args.history) if args.history else None
+    # Each plant type runs on its own weights; workers load them all up front so no file waits on a cold load
+    weights = {plant_type: args.weights or model_registry.resolve_weights(plant_type, args.tier)
+               for plant_type in roots.values()}
+    options = {"weights": next(iter(weights.values())), "preload": sorted(set(weights.values())),
+               "backend": args.backend}
+    futures = {}
+    next_scan = next_report = 0.0
+    with open(args.output, "a", encoding="utf-8") as stream, \
+            ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker,
+                                initargs=(options, args.threads_per_worker)) as pool:
+        writer = JsonlWriter(stream)
+        try:
+            while True:
+                now = time.monotonic()
+                if now >= next_scan:
+                    scheduler.scan()
+                    next_scan = now + args.interval
+                # Keep a bounded number of files in flight; the rest wait in the per-source queues
+                completed = 0
+                while len(futures) < args.workers * 2:
+                    item = scheduler.next_item()
+                    if item is None:
+                        break
+                    source, path, mtime = item
+                    plant_type = scheduler.plant_types[source]
+                    decision, regions, previous, frame_signature = "full", None, None, None
+                    if gate:
+                        try:
+                            with open(path, "rb") as f:
+                                frame_signature = signature(f.read())
+                        except OSError:
+                            pass
+                        decision, regions, previous = gate.check(source, frame_signature)
+                    if decision == "skip":
+                        # Nothing changed since the last processed frame: reuse its results without inference
+                        lag = scheduler.complete(item, "skipped")
+                        writer.write({"path": path, "source": source, "plant_type": plant_type,
+                                      "lag_s": round(lag, 2), "detections": with_settings(plant_type, previous),
+                                      "setpoint": aggregate(plant_type, previous), "reused": True})
+                        if store:
+                            store.record(source, plant_type, previous, ts=mtime / 1e9, path=path)
+                        completed += 1
+                        continue
+                    future = pool.submit(process_file, path, plant_type, args.conf, weights[plant_type], regions,
+                                         previous)
+                    futures[future] = (item, frame_signature)
+
+                # Block until a result arrives or the next scan is due; with nothing in flight (idle, or every
+                # queued frame was skipped) just sleep until the scan, never spinning on an empty wait()
+                timeout = max(0.0, min(next_scan, next_report) - time.monotonic())
+                if futures:
+                    finished, _ = wait(futures, timeout=timeout, return_when=FIRST_COMPLETED)
+                else:
+                    finished = ()
+                    time.sleep(timeout)
+                completed += len(finished)
+                for future in finished:
+                    item, frame_signature = futures.pop(future)
+                    source, path, mtime = item
+                    try:
+                        record = future.result()
+                    except Exception as error:
+                        record = {"error": str(error)}
+                    lag = scheduler.complete(item, "failed" if "error" in record else "processed")
+                    if gate and "error" not in record:
+                        gate.update(source, frame_signature, record["detections"], mtime)
+                    if store and "error" not in record:
+                        store.record(source, scheduler.plant_types[source], record["detections"], ts=mtime / 1e9,
+                                     path=path)
+                    writer.write(dict({"path": path, "source": source, "plant_type": scheduler.plant_types[source],
+                                       "lag_s": round(lag, 2)}, **record))
+                if completed:
+                    stream.flush()
+                    checkpoint.save(scheduler.pending_files())
+
+                if now >= next_report:
+                    print(json.dumps(scheduler.stats()), file=sys.stderr)
+                    next_report = now + args.report_interval
+        except KeyboardInterrupt:
+            pass
+        finally:
+            checkpoint.save(scheduler.pending_files())
+            if store:
+                store.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+import threading
+import time
+
+import metrics
+import model_registry
+from pipeline import record_detections, parse_detections, preprocess
+
+# Model input sizes a budgeted request may run at, largest (the training resolution) first
+RESOLUTIONS = (640, 480, 320)
+FULL_RESOLUTION = RESOLUTIONS[0]
+# Detections within this much of the confidence threshold make a low-resolution pass ambiguous
+AMBIGUITY_MARGIN = 0.1
+# Weight of the newest measurement in the running latency estimates
+SMOOTHING = 0.2
+# Seconds after which a size's estimate may be undercut by fresher measurements of other sizes
+RECHECK_SECONDS = 30.0
+
+# Running estimates of inference seconds per (weights, input size), from measured passes. Sizes that
+# have not run yet are extrapolated by pixel count from a measured size of the same model. Only passes that
+# are planned get measured, so an estimate that went stale (say one slow full-resolution pass under load)
+# would keep that size from ever running again; after RECHECK_SECONDS it is capped by the extrapolation
+# from a size measured since, which lets the size be planned and measured again.
+class LatencyEstimates:
+    def __init__(self):
+        self.seconds = {}
+        self.lock = threading.Lock()
+
+    def record(self, weights, imgsz, seconds):
+        key = (weights, imgsz)
+        with self.lock:
+            previous = self.seconds.get(key)
+            # A stale estimate is replaced rather than smoothed, so one old outlier can't linger
+            if previous is not None and time.monotonic() - previous[1] <= RECHECK_SECONDS:
+                seconds = previous[0] + SMOOTHING * (seconds - previous[0])
+            self.seconds[key] = (seconds, time.monotonic())
+
+    # Function to estimate one pass (None while the model has never run)
+    def estimate(self, weights, imgsz):
+        with self.lock:
+            known = {size: value for (w, size), value in self.seconds.items() if w == weights}
+        if imgsz in known:
+            seconds, measured = known[imgsz]
+            fresher = {size: value for size, value in known.items() if value[1] > measured}
+            if fresher and time.monotonic() - measured > RECHECK_SECONDS:
+                size = min(fresher, key=lambda size: abs(size - imgsz))
+                return min(seconds, fresher[size][0] * (imgsz / size) ** 2)
+            return seconds
+        if known:
+            size = min(known, key=lambda size: abs(size - imgsz))
+            return known[size][0] * (imgsz / size) ** 2
+        return None
+
+estimates = LatencyEstimates()
+
+# Function to list the (tier, weights) a plant type can run on, most accurate first
+def _candidates(plant_type):
+    tiers = model_registry.tiers(plant_type)
+    candidates = [(tier, model_registry.resolve_weights(plant_type, tier)) for tier in reversed(tiers)]
+    return candidates or [(model_registry.DEFAULT_TIER, model_registry.resolve_weights(plant_type))]
+
+# Function to choose how to run within `remaining` seconds: (tier, weights, first pass size, refine). For each
+# tier, most accurate first, the cheapest plan is a reduced-resolution first pass that leaves room for a
+# full-resolution refine, then a single full-resolution pass; only when no tier manages either does a single
+# reduced-resolution pass run. Models that are not resident are skipped, since a cold load would blow any
+# interactive budget; while none is, the default tier (the one loaded at startup) is used and the others are
+# loaded in the background. A model that has never run starts at full resolution so it gets measured.
+def choose_plan(plant_type, remaining):
+    candidates = _candidates(plant_type)
+    resident = [(tier, weights) for tier, weights in candidates if model_registry.is_loaded(weights)]
+    if not resident:
+        default = model_registry.resolve_weights(plant_type)
+        model_registry.preload(default, more=[(weights, model_registry.backend()) for _, weights in candidates
+                                              if weights != default])
+        resident = [next(((tier, weights) for tier, weights in candidates if weights == default),
+                         (model_registry.DEFAULT_TIER, default))]
+    candidates = resident
+    for tier, weights in candidates:
+        full = estimates.estimate(weights, FULL_RESOLUTION)
+        if full is None:
+            return tier, weights, FULL_RESOLUTION, False
+        for imgsz in RESOLUTIONS[1:]:
+            if estimates.estimate(weights, imgsz) + full <= remaining:
+                return tier, weights, imgsz, True
+        if full <= remaining:
+            return tier, weights, FULL_RESOLUTION, False
+    for imgsz in RESOLUTIONS[1:]:
+        for tier, weights in candidates:
+            if estimates.estimate(weights, imgsz) <= remaining:
+                return tier, weights, imgsz, False
+    tier, weights = candidates[-1]
+    return tier, weights, RESOLUTIONS[-1], False
+
+# Function to run one timed pass, feeding the latency estimates
+def _run_pass(image, weights, imgsz, conf):
+    # Any load and warm-up happen before the clock starts, so they never count as inference time
+    model = model_registry.get_model(weights)
+    start = time.perf_counter()
+    with metrics.stage("inference"):
+        results = model_registry.predict(image, weights, save=False, conf=conf, imgsz=imgsz, verbose=False)
+    estimates.record(weights, imgsz, time.perf_counter() - start)
+    return parse_detections(results[0], model.names)
+
+# Function to detect within a latency budget (seconds, counted from `start`, a time.perf_counter() value taken
+# when the request arrived, so queue wait and decode count against it). A reduced-resolution first pass is
+# refined by a full-resolution pass only when some confidences sit within AMBIGUITY_MARGIN of the threshold
+# and the budget still has room for it; clear-cut images finish after the cheap pass. Returns (detections,
+# report) with the path taken and the measured latency.
+def detect_budgeted(original_image, plant_type, budget, conf=0.25, start=None, preprocessed=None):
+    start = time.perf_counter() if start is None else start
+    image = preprocess(original_image, plant_type) if preprocessed is None else preprocessed
+    tier, weights, imgsz, refine = choose_plan(plant_type, budget - (time.perf_counter() - start))
+    model_registry.record_use(weights)
+
+    refined = False
+    if imgsz == FULL_RESOLUTION:
+        detections = _run_pass(image, weights, imgsz, conf)
+    else:
+        # Look slightly below the threshold so near misses count as ambiguous too
+        candidates = _run_pass(image, weights, imgsz, max(0.0, conf - AMBIGUITY_MARGIN))
+        detections = [detection for detection in candidates if detection['Confidence'] >= conf]
+        ambiguous = any(abs(detection['Confidence'] - conf) < AMBIGUITY_MARGIN for detection in candidates)
+        estimate = estimates.estimate(weights, FULL_RESOLUTION)
+        remaining = budget - (time.perf_counter() - start)
+        if refine and ambiguous and estimate <= remaining:
+            detections = _run_pass(image, weights, FULL_RESOLUTION, conf)
+            refined = True
+
+    record_detections([detections])
+    latency = time.perf_counter() - start
+    return detections, {"path": f"{tier}@{imgsz}" + (f"+refine@{FULL_RESOLUTION}" if refined else ""),
+                        "tier": tier, "imgsz": imgsz, "refined": refined,
+                        "latency_ms": round(latency * 1000, 1), "budget_ms": round(budget * 1000, 1),
+                        "within_budget": latency <= budget}
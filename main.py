@@ -1,66 +1,377 @@
+import importlib
+import threading
+import time
+from itertools import islice
+
 import streamlit as st
-import cv2
-import numpy as np
-from ultralytics import YOLO
-
-# Define the label map
-label_map = {
-    'Flowering': 'Growing',
-    'Vegetative': 'Growing',
-    'Germination': 'Germination',
-    'Harvesting': 'Harvesting'
-}
-
-# Function to preprocess image for Thurinus Lettuce
-def preprocess_thurinus(image):
-    hsv_img = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
-    hsv_img[:, :, 0] = 60  # Change hue to a greenish value
-    green_hued_img = cv2.cvtColor(hsv_img, cv2.COLOR_HSV2BGR)
-    return green_hued_img
-
-# Function to provide system response based on growth stage and plant type
-def get_system_response(plant_type, growth_stage):
-    responses = {
-        "Olmetie Lettuce": {
-            "Germination": {
-                "light_color": "Blue",
-                "light_intensity": "5,000-10,000 lux",
-                "temperature": "16-20°C"
-            },
-            "Growing": {
-                "light_color": "Red + Blue",
-                "light_intensity": "15,000-20,000 lux",
-                "temperature": "18-22°C"
-            },
-            "Harvesting": {
-                "light_color": "Red + Blue",
-                "light_intensity": "15,000-20,000 lux",
-                "temperature": "18-22°C"
-            }
-        },
-        "Thurinus Lettuce": {
-            "Germination": {
-                "light_color": "Blue",
-                "light_intensity": "5,000-8,000 lux",
-                "temperature": "15-19°C"
-            },
-            "Growing": {
-                "light_color": "Red + Blue",
-                "light_intensity": "12,000-18,000 lux",
-                "temperature": "18-24°C"
-            },
-            "Harvesting": {
-                "light_color": "Red + Blue",
-                "light_intensity": "12,000-18,000 lux",
-                "temperature": "18-24°C"
-            }
-        }
-    }
-    return responses.get(plant_type, {}).get(growth_stage, {})
+import metrics
+import model_registry
+from executor import QUEUE_TIMEOUT, QueueFull, get_executor
+from history import get_store
+from inference_client import INFERENCE_URL, InferenceUnavailable, detect_remote
+from profiles import aggregate, profiles
+from result_cache import cache
+from stage_graph import StageGraph, content_key
+
+# Function to import the image pipeline (OpenCV, NumPy, Pillow) on a background thread, once per process.
+# The functions below import it on first use, so the page shell renders before the heavy modules load.
+@st.cache_resource
+def start_warm_up():
+    thread = threading.Thread(target=importlib.import_module, args=("pipeline",), daemon=True)
+    thread.start()
+    return thread
+
+# Function to start loading the most used models in the background, once per process (not on every rerun)
+@st.cache_resource
+def start_preload():
+    model_registry.preload_most_used()
+    return True
+
+# Function to render one device setpoint for an image's detections, with the stage breakdown behind it
+def render_settings(option, detection_results, setpoint=None):
+    setpoint = setpoint or aggregate(option, detection_results)
+    if setpoint is None:
+        return
+    share = setpoint['distribution'][setpoint['stage']]
+    st.markdown(f"<p class='settings'>🌱 <b>Growth Stage:</b> {setpoint['stage']} ({share:.0%})</p>", unsafe_allow_html=True)
+    if "lux" in setpoint:
+        low, high = setpoint['lux_range']
+        st.markdown(f"<p class='settings'>🌈 <b>Light Color:</b> {setpoint['light_color']} "
+                    f"(red {setpoint['red_ratio']:.0%} / blue {setpoint['blue_ratio']:.0%})</p>", unsafe_allow_html=True)
+        st.markdown(f"<p class='settings'>💡 <b>Light Intensity:</b> {setpoint['lux']:,} lux ({low:,}-{high:,})</p>",
+                    unsafe_allow_html=True)
+        low, high = setpoint['temperature_range_c']
+        st.markdown(f"<p class='settings'>🌡️ <b>Temperature:</b> {setpoint['temperature_c']:g}°C ({low:g}-{high:g})</p>",
+                    unsafe_allow_html=True)
+    st.caption(" · ".join(f"{stage}: {count} detected, {setpoint['distribution'][stage]:.0%} of confidence"
+                          for stage, count in sorted(setpoint['counts'].items())))
+    st.write("----")
+
+# Function to show the stage timings of the last detection in the sidebar
+def render_timings(timings):
+    if timings:
+        st.session_state["last_timings"] = timings
+    timings = st.session_state.get("last_timings")
+    st.sidebar.markdown("**Stage Timings**")
+    if not timings:
+        st.sidebar.caption("Run a detection to see where the time goes.")
+        return
+    rows = "\n".join(f"| {stage} | {seconds * 1000:.1f} |" for stage, seconds in timings.items())
+    st.sidebar.markdown(f"| Stage | ms |\n|---|---|\n{rows}\n| **total** | **{sum(timings.values()) * 1000:.1f}** |")
+    peak_rss = metrics.peak_rss_bytes()
+    if peak_rss is not None:
+        st.sidebar.caption(f"Peak memory: {peak_rss / 2**20:.0f} MB")
+
+# Raised when an upload is not an image OpenCV can decode
+class UnreadableUpload(Exception):
+    pass
+
+# Width of the annotated previews (2x the on-screen size so they stay sharp on high-DPI displays)
+DISPLAY_WIDTH = 600
+
+# Function to detect on the reduced image, in-process or through the inference service when configured.
+# Sliced inference (tiling = (tile size, overlap)) always runs in-process. `image` is the preprocessed image.
+def run_detection(data, original_image, image, scale, option, conf, weights, tiling=None):
+    from pipeline import detect_image, detect_tiled, scale_detections
+
+    if tiling:
+        tile_size, overlap = tiling
+        return detect_tiled(original_image, option, conf=conf, weights=weights, tile_size=tile_size, overlap=overlap,
+                            preprocessed=image)
+    if INFERENCE_URL:
+        detection_results = detect_remote(data, option, conf=conf)
+        return scale_detections(detection_results, (1 / scale[0], 1 / scale[1]))
+    return detect_image(original_image, option, conf=conf, weights=weights, preprocessed=image)
+
+# Function to run detection for one upload on an executor worker, decoding and preprocessing it first unless the
+# session already holds those (decoded = (original image, scale), image = the preprocessed image; None for
+# either means compute it). The result is cached with its default-size previews, so the work is kept even if
+# the session that asked for it has moved on. With a latency budget (seconds since `requested`, a
+# time.perf_counter() value) the model picks its own resolution and tier; those results depend on the load at
+# the time, so they are returned with their latency report instead of cached. Returns (decoded, preprocessed
+# image, entry) so the session can keep the intermediates.
+def detect_upload(data, min_side, decoded, image, option, conf, weights, tiling, cache_key, budget=None,
+                  requested=None):
+    from latency_budget import detect_budgeted
+    from pipeline import annotate_image, decode_reduced, encode_jpeg, preprocess, scale_detections, thumbnail
+
+    if decoded is None:
+        decoded = decode_reduced(data, min_side)
+    original_image, scale = decoded
+    if original_image is None:
+        return decoded, None, None
+    # The inference service preprocesses on its side
+    if image is None and not (INFERENCE_URL and not tiling):
+        image = preprocess(original_image, option)
+
+    latency = None
+    if budget:
+        detection_results, latency = detect_budgeted(original_image, option, budget, conf, requested,
+                                                     preprocessed=image)
+    else:
+        detection_results = run_detection(data, original_image, image, scale, option, conf, weights, tiling)
+    annotated = encode_jpeg(annotate_image(original_image, detection_results, DISPLAY_WIDTH))
+    preview = encode_jpeg(thumbnail(original_image, DISPLAY_WIDTH))
+    if latency:
+        entry = {"detections": scale_detections(detection_results, scale), "annotated": annotated,
+                 "preview": preview, "latency": latency}
+    else:
+        entry = cache.put(cache_key, scale_detections(detection_results, scale), annotated, preview)
+    return decoded, image, entry
+
+# Function to detect one chunk of uploads ((name, bytes) pairs, at most one batch) on an executor worker;
+# returns (name, annotated preview, detections) per readable image
+def detect_uploads(named_bytes, option, weights, batch_size):
+    from pipeline import annotate_image, detect_batch, encode_jpeg, prepare_images, scale_detections
+
+    prepared = [item for item in prepare_images(named_bytes, option) if item[1] is not None]
+    detections = detect_batch([image for _, _, image, _ in prepared], batch_size=batch_size, weights=weights)
+    # Keep only pre-encoded thumbnails so pagination reruns stay cheap
+    return [(name, encode_jpeg(annotate_image(original_image, detection_results, DISPLAY_WIDTH)),
+             scale_detections(detection_results, scale))
+            for (name, original_image, _, scale), detection_results in zip(prepared, detections)]
+
+# Function to run a job on the shared inference executor and wait for it behind the spinner, showing the
+# queue position. Raises TimeoutError if it is still queued after QUEUE_TIMEOUT seconds.
+def run_queued(fn, *args, priority=0):
+    ticket = get_executor().submit(fn, *args, priority=priority)
+    status = st.empty()
+    deadline = time.monotonic() + QUEUE_TIMEOUT
+    while not ticket.done():
+        position = ticket.position()
+        if position and time.monotonic() > deadline and ticket.cancel():
+            status.empty()
+            raise TimeoutError(f"still {position} requests ahead after {QUEUE_TIMEOUT:.0f}s")
+        status.caption(f"Waiting for a free inference worker: {position} request(s) ahead of you" if position
+                       else "Detecting...")
+        time.sleep(0.2)
+    status.empty()
+    return ticket.result()
+
+# Function to render an upload's preview and annotated image at a display width. The entry already holds both
+# at the default width; only other widths call decoded() for the (original image, scale) of the upload.
+def render_previews(entry, decoded, width):
+    from pipeline import annotate_image, encode_jpeg, scale_detections, thumbnail
+
+    if width * 2 == DISPLAY_WIDTH:
+        return entry["preview"], entry["annotated"]
+    original_image, scale = decoded()
+    detection_results = scale_detections(entry["detections"], (1 / scale[0], 1 / scale[1]))
+    return (encode_jpeg(thumbnail(original_image, width * 2)),
+            encode_jpeg(annotate_image(original_image, detection_results, width * 2)))
+
+# Single image upload and detection. The flow runs as a stage graph memoized in session state
+# (decode -> preprocess -> detect -> settings -> render), so a rerun only recomputes the stages whose inputs
+# changed and the results stay on screen while other widgets are used.
+def single_image_mode(option, weights, source=None):
+    from pipeline import DECODE_MIN_SIDE, TILED_DECODE_MIN_SIDE, decode_reduced
+
+    requested = time.perf_counter()
+    # Sliced inference finds small seedlings on wide tray shots that whole-image detection misses
+    tiling = None
+    if st.sidebar.checkbox("Sliced Inference (large images)"):
+        tile_size = st.sidebar.select_slider("Tile Size:", options=[320, 480, 640, 960, 1280], value=640)
+        overlap = st.sidebar.slider("Tile Overlap:", min_value=0.0, max_value=0.5, value=0.2, step=0.05)
+        tiling = (tile_size, overlap)
+    # A latency budget keeps the app responsive under load by letting the model trade resolution for speed
+    budget = None
+    if not tiling and not INFERENCE_URL and st.sidebar.checkbox("Latency Budget"):
+        budget = st.sidebar.slider("Target (ms):", min_value=100, max_value=2000, value=300, step=50) / 1000
+    conf = st.sidebar.slider("Confidence Threshold:", min_value=0.05, max_value=0.95, value=0.25, step=0.05)
+    width = st.sidebar.select_slider("Preview Width:", options=[200, 300, 450, 600], value=DISPLAY_WIDTH // 2)
+
+    if "stage_graph" not in st.session_state:
+        st.session_state["stage_graph"] = StageGraph()
+    graph = st.session_state["stage_graph"]
+
+    col1, col2 = st.columns([1, 1])
+
+    with col1:
+        st.markdown("<p class='subheader'>Input Phase</p>", unsafe_allow_html=True)
+        uploaded_file = st.file_uploader("Upload an Image", type=["jpg", "jpeg", "png"])
+        if not uploaded_file:
+            graph.clear()
+            return
+
+        # Zero-copy view of the upload; it is hashed and decoded in place
+        data = uploaded_file.getbuffer()
+        upload = content_key(data)
+        if st.button("Detect Growth Stage"):
+            st.session_state["detected_upload"] = upload
+        if st.session_state.get("detected_upload") != upload:
+            return
+
+        # Stages pull their inputs lazily, so a cached detection never decodes the upload at all. Decode and
+        # preprocessing run as executor jobs like inference, and arrays too big for the session cap are held
+        # only for this rerun.
+        min_side = TILED_DECODE_MIN_SIDE if tiling else DECODE_MIN_SIDE
+        held = {}
+        decode_inputs, preprocess_inputs = (upload, min_side), (upload, min_side, option)
+
+        def decoded():
+            if "decode" not in held:
+                held["decode"] = graph.compute("decode", decode_inputs,
+                                               lambda: run_queued(decode_reduced, data, min_side))[1]
+            return held["decode"]
+
+        def detect():
+            cache_key = cache.key(data, option, conf, weights, *(tiling or ()), backend=model_registry.backend())
+            # Re-uploads from any session skip decode, preprocessing and inference
+            entry = None if budget else cache.get(cache_key)
+            if entry is None:
+                # Decode, preprocessing and inference run as one queued job (one wait in the queue), starting
+                # from whatever intermediates this session still holds; the job hands them back to be kept
+                found, kept = graph.lookup("decode", decode_inputs)
+                decoded_image = held.get("decode", kept if found else None)
+                found, kept = graph.lookup("preprocess", preprocess_inputs)
+                image = None
+                if found and decoded_image is not None:
+                    # Plant types without preprocessing store None: the decoded array is reused
+                    image = decoded_image[0] if kept is None else kept
+                with st.spinner("Processing..."):
+                    decoded_image, image, entry = run_queued(detect_upload, data, min_side, decoded_image, image,
+                                                             option, conf, weights, tiling, cache_key, budget,
+                                                             requested)
+                if entry is None:
+                    raise UnreadableUpload(f"{uploaded_file.name} could not be read as an image")
+                held["decode"] = graph.compute("decode", decode_inputs, lambda: decoded_image)[1]
+                if image is not None:
+                    graph.compute("preprocess", preprocess_inputs,
+                                  lambda: None if image is decoded_image[0] else image)
+            return entry
+
+        try:
+            detect_key, entry = graph.compute("detect", (upload, option, conf, weights, tiling, budget), detect)
+            _, (preview, annotated) = graph.compute("render", (detect_key, width),
+                                                    lambda: render_previews(entry, decoded, width))
+        except UnreadableUpload as error:
+            st.error(str(error))
+            return
+        except (InferenceUnavailable, QueueFull, TimeoutError) as error:
+            st.error(f"Detection failed: {error or 'the server is busy, please try again'}")
+            return
+        # History gets one record per upload and source, however often settings change or the page reruns
+        if source and st.session_state.get("recorded_upload") != (upload, source):
+            get_store().record(source, option, entry["detections"], path=uploaded_file.name)
+            st.session_state["recorded_upload"] = (upload, source)
+        # Settings follow edits to the profile file as well as new detections
+        profiles.refresh()
+        _, setpoint = graph.compute("settings", (detect_key, profiles.mtime),
+                                    lambda: aggregate(option, entry["detections"]))
+
+        if entry.get("latency"):
+            latency = entry["latency"]
+            st.caption(f"Path: {latency['path']}, {latency['latency_ms']:.0f} ms "
+                       f"(budget {latency['budget_ms']:.0f} ms)")
+        if setpoint:
+            st.markdown("<p class='subheader'>Device Configuration</p>", unsafe_allow_html=True)
+            render_settings(option, entry["detections"], setpoint)
+
+        with col2:
+            st.markdown("<p class='subheader'>Detection Results</p>", unsafe_allow_html=True)
+            st.image(preview, caption="Uploaded Image", width=width)
+            st.image(annotated, caption="Detected Growth Stages", width=width)
+
+    stats = graph.stats()
+    st.sidebar.caption(f"Session stages: {stats['entries']} kept ({stats['bytes'] / 2**20:.1f} MB), "
+                       f"{stats['hits']} reused / {stats['misses']} computed")
+
+# Batch upload of many images (or a zip) with batched detection and a paginated grid
+def batch_mode(option, weights, source=None):
+    batch_size = st.sidebar.number_input("Batch Size:", min_value=1, max_value=64, value=8)
+    page_size = st.sidebar.number_input("Images per Page:", min_value=3, max_value=60, value=12, step=3)
+
+    st.markdown("<p class='subheader'>Input Phase</p>", unsafe_allow_html=True)
+    uploaded_files = st.file_uploader("Upload Images or a Zip Archive", type=["jpg", "jpeg", "png", "zip"],
+                                      accept_multiple_files=True)
+
+    if uploaded_files and st.button("Detect Growth Stages"):
+        from pipeline import expand_uploads
+
+        with st.spinner("Processing..."):
+            # Each batch is its own job queued behind single-image requests, so other users' requests run
+            # between the batches of a big upload instead of waiting for all of it. Batches are read, decoded
+            # and preprocessed one at a time, so peak memory follows the batch size, not the upload count.
+            named_bytes = expand_uploads(uploaded_files)
+            results = []
+            try:
+                while True:
+                    chunk = list(islice(named_bytes, int(batch_size)))
+                    if not chunk:
+                        break
+                    results.extend(run_queued(detect_uploads, chunk, option, weights, int(batch_size), priority=1))
+            except (QueueFull, TimeoutError) as error:
+                st.error(f"Detection failed: {error or 'the server is busy, please try again'}")
+                return
+            st.session_state["batch_results"] = results
+        st.session_state["batch_option"] = (option, weights)
+        st.session_state.pop("batch_report", None)
+        if source:
+            for name, _, detection_results in st.session_state["batch_results"]:
+                get_store().record(source, option, detection_results, path=name)
+
+    batch_results = st.session_state.get("batch_results")
+    if not batch_results or st.session_state.get("batch_option") != (option, weights):
+        return
+
+    st.markdown("<p class='subheader'>Detection Results</p>", unsafe_allow_html=True)
+    # Shareable report: contact sheets of the annotated previews with settings and stage counts per tray
+    if st.button("Build Report"):
+        import io
+        from report import write_preview_report
+
+        with st.spinner("Building report..."):
+            stream = io.StringIO()
+            write_preview_report(batch_results, option, stream, tray=source or "upload")
+            st.session_state["batch_report"] = stream.getvalue().encode("utf-8")
+    if st.session_state.get("batch_report"):
+        st.download_button("Download Report", st.session_state["batch_report"], file_name="lumina-report.html",
+                           mime="text/html")
+    page_count = (len(batch_results) + page_size - 1) // page_size
+    page = st.number_input(f"Page (of {page_count}):", min_value=1, max_value=page_count, value=1)
+    page_results = batch_results[(page - 1) * page_size:page * page_size]
+
+    for row_start in range(0, len(page_results), 3):
+        columns = st.columns(3)
+        for column, (name, preview, detection_results) in zip(columns, page_results[row_start:row_start + 3]):
+            with column:
+                st.image(preview, caption=name, width=300)
+                with st.expander(f"Device Configuration ({len(detection_results)} detections)"):
+                    render_settings(option, detection_results)
+
+# Growth stage counts over time and stage transitions for one recorded source
+def history_mode(store):
+    import pandas as pd
+
+    sources = [entry["source"] for entry in store.sources()]
+    if not sources:
+        st.info("No detections recorded yet.")
+        return
+    st.markdown("<p class='subheader'>Detection History</p>", unsafe_allow_html=True)
+    source = st.selectbox("Source:", sources)
+    days = st.slider("Days:", min_value=1, max_value=90, value=7)
+    bucket = st.radio("Bucket:", ["Hour", "Day"], horizontal=True)
+    start = time.time() - days * 86400
+
+    counts = store.stage_counts(source, start, bucket=3600 if bucket == "Hour" else 86400)
+    if counts:
+        chart = pd.DataFrame(counts).pivot_table(index="time", columns="stage", values="count", fill_value=0)
+        chart.index = pd.to_datetime(chart.index, unit="s")
+        st.line_chart(chart)
+
+    transitions = store.stage_transitions(source, start)
+    st.dataframe([{"Time": time.strftime("%Y-%m-%d %H:%M", time.localtime(entry["time"])),
+                   "From": entry["from"] or "-", "To": entry["stage"]} for entry in transitions],
+                 use_container_width=True)
 
 # Streamlit app
 def main():
     st.set_page_config(layout="wide", page_title="Lumina Flora")
+    metrics.start_exporters_from_env()
+    # Heavy imports and the model load overlap with the user picking a plant type
+    start_warm_up()
+    if not INFERENCE_URL:
+        start_preload()
 
     st.markdown("""
         <style>
@@ -79,70 +390,41 @@ def main():
 
     if option != "None":
         st.sidebar.markdown(f"**Plant Type:** {option}")
+        # Plant types with several trained model sizes let the user trade accuracy for speed
+        tiers = model_registry.tiers(option)
+        tier = st.sidebar.radio("Model:", tiers, index=tiers.index(model_registry.DEFAULT_TIER)
+                                if model_registry.DEFAULT_TIER in tiers else 0) if len(tiers) > 1 else None
+        weights = model_registry.resolve_weights(option, tier)
+        # Detections are kept in the history database when LUMINA_HISTORY_DB is set
+        store = get_store()
+        mode = st.sidebar.radio("Mode:", ["Single Image", "Batch Upload"] + (["History"] if store else []))
+        source = st.sidebar.text_input("Tray / Source:", value="upload") if store else None
+
+        show_timings = st.sidebar.checkbox("Show Timing Panel")
+
+        if show_timings:
+            metrics.begin_request()
+        if mode == "History":
+            history_mode(store)
+        elif mode == "Batch Upload":
+            batch_mode(option, weights, source)
+        else:
+            single_image_mode(option, weights, source)
+        if show_timings:
+            render_timings(metrics.end_request())
+
+        if profiles.error:
+            st.sidebar.warning(f"Profile file not reloaded: {profiles.error}")
 
-        col1, col2 = st.columns([1, 1])
-
-        with col1:
-            st.markdown("<p class='subheader'>Input Phase</p>", unsafe_allow_html=True)
-            uploaded_file = st.file_uploader("Upload an Image", type=["jpg", "jpeg", "png"])
-
-            if uploaded_file:
-                file_bytes = np.asarray(bytearray(uploaded_file.read()), dtype=np.uint8)
-                original_image = cv2.imdecode(file_bytes, cv2.IMREAD_COLOR)
-
-                if option == "Thurinus Lettuce":
-                    image = preprocess_thurinus(original_image)
-                else:
-                    image = original_image
-
-                if st.button("Detect Growth Stage"):
-                    with st.spinner("Processing..."):
-                        model = YOLO("40 Epoch Plant Growth Stage YOLOv8 Model.pt")
-                        results = model.predict(source=image, save=False, conf=0.25)
-
-                    detection_results = []
-                    annotated_image = original_image.copy()
-
-                    for result in results[0].boxes.data.tolist():
-                        x1, y1, x2, y2, confidence, class_id = result[0], result[1], result[2], result[3], result[4], result[5]
-                        confidence = round(confidence, 2)
-                        class_name = model.names[class_id]
-                        class_name = label_map.get(class_name, class_name)
-                        x1, y1, x2, y2 = map(int, (x1, y1, x2, y2))
-                        cv2.rectangle(annotated_image, (x1, y1), (x2, y2), (255, 255, 0), 4)
-                        label = f"{class_name} ({confidence:.2f})"
-                        font_scale, font_thickness = 1.0, 2
-                        text_size = cv2.getTextSize(label, cv2.FONT_HERSHEY_SIMPLEX, font_scale, font_thickness)[0]
-                        text_x, text_y = x1, y1 - 10
-                        label_bg_x2 = text_x + text_size[0] + 4
-                        label_bg_y2 = text_y + text_size[1] + 4
-                        cv2.rectangle(annotated_image, (text_x - 2, text_y - text_size[1] - 4), 
-                                      (label_bg_x2, label_bg_y2), (255, 255, 0), -1)
-                        cv2.putText(annotated_image, label, (text_x, text_y), 
-                                    cv2.FONT_HERSHEY_SIMPLEX, font_scale, (0, 0, 0), font_thickness)
-
-                        detection_results.append({
-                            'Label': class_name,
-                            'Confidence': confidence,
-                            'Bounding Box': (x1, y1, x2, y2)
-                        })
-
-                    if detection_results:
-                        st.markdown("<p class='subheader'>Device Configuration</p>", unsafe_allow_html=True)
-                        for result in detection_results:  # Iterate through the list of results
-                            response = get_system_response(option, result['Label'])
-                            if response:
-                                st.markdown(f"<p class='settings'>🌱 <b>Growth Stage:</b> {result['Label']}</p>", unsafe_allow_html=True)
-                                st.markdown(f"<p class='settings'>🔍 <b>Confidence:</b> {result['Confidence']}</p>", unsafe_allow_html=True)
-                                st.markdown(f"<p class='settings'>🌈 <b>Light Color:</b> {response['light_color']}</p>", unsafe_allow_html=True)
-                                st.markdown(f"<p class='settings'>💡 <b>Light Intensity:</b> {response['light_intensity']}</p>", unsafe_allow_html=True)
-                                st.markdown(f"<p class='settings'>🌡️ <b>Temperature:</b> {response['temperature']}</p>", unsafe_allow_html=True)
-                            st.write("----")
-
-                    with col2:
-                        st.markdown("<p class='subheader'>Detection Results</p>", unsafe_allow_html=True)
-                        st.image(cv2.cvtColor(original_image, cv2.COLOR_BGR2RGB), caption="Uploaded Image", width=300)
-                        st.image(cv2.cvtColor(annotated_image, cv2.COLOR_BGR2RGB), caption="Detected Growth Stages", width=300)
+        queue_stats = get_executor().stats()
+        st.sidebar.caption(f"Inference queue: {queue_stats['queued']} waiting, {queue_stats['running']} running "
+                           f"(p95 wait {queue_stats['wait_p95_s']:.1f}s)")
+        stats = cache.stats()
+        st.sidebar.caption(f"Result cache: {stats['hits'] + stats['disk_hits']} hits / {stats['misses']} misses "
+                           f"({stats['entries']} entries, {stats['bytes'] / 2**20:.1f} MB)")
+        model_stats = model_registry.stats()
+        st.sidebar.caption(f"Models: {len(model_stats['models'])} resident "
+                           f"({model_stats['used_mb']:.0f} / {model_stats['budget_mb']} MB)")
 
     st.sidebar.markdown("""
         <ul class="sidebar-names">
@@ -0,0 +1,235 @@
+import json
+import logging
+import logging.handlers
+import os
+import threading
+import time
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Instrumentation is off unless LUMINA_METRICS is set; disabled timers are a shared no-op context
+ENABLED = os.environ.get("LUMINA_METRICS", "").lower() in ("1", "true", "yes")
+
+# Histogram buckets and help text for every exported metric
+HISTOGRAMS = {
+    "lumina_stage_seconds": ((0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10),
+                             "Time spent in each detection stage"),
+    "lumina_detections_per_image": ((0, 1, 5, 10, 25, 50, 100, 250, 500), "Detections found per image"),
+    "lumina_image_megapixels": ((0.3, 1, 2, 5, 12, 25, 50), "Size of the uploaded images"),
+    "lumina_model_load_seconds": ((1, 2.5, 5, 10, 30, 60), "Time to load and warm up a model"),
+    "lumina_queue_wait_seconds": ((0.01, 0.05, 0.1, 0.5, 1, 2.5, 5, 10, 30, 60),
+                                  "Time jobs waited for an inference worker"),
+    "lumina_ingest_lag_seconds": ((1, 5, 15, 60, 300, 900, 3600), "Time from capture to result in the ingest service"),
+}
+COUNTERS = {
+    "lumina_model_loads_total": "Models loaded into this process",
+    "lumina_model_evictions_total": "Models unloaded to stay within the model memory budget",
+    "lumina_images_total": "Images run through detection",
+    "lumina_ingest_files_total": "Files handled by the ingest service, by source and status",
+    "lumina_change_gate_frames_total": "Frames seen by the change gate, by decision (skip, regions, full)",
+}
+GAUGES = {
+    "lumina_ingest_queue_depth": "Files waiting in the ingest queue, by source",
+    "lumina_ingest_in_flight": "Files being processed by the ingest workers",
+    "lumina_model_memory_bytes": "Memory charged to the resident models against the model memory budget",
+}
+
+_NOOP = nullcontext()
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+_gauges = {}
+_local = threading.local()
+_exporters_started = False
+
+# Function to turn instrumentation on or off at runtime
+def enable(flag=True):
+    global ENABLED
+    ENABLED = flag
+
+def _label_key(labels):
+    return tuple(sorted(labels.items())) if labels else ()
+
+# Function to record one observation in a histogram
+def observe(name, value, **labels):
+    if not ENABLED:
+        return
+    buckets = HISTOGRAMS[name][0]
+    key = (name, _label_key(labels))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = {"buckets": [0] * len(buckets), "sum": 0.0, "count": 0}
+        for i, bound in enumerate(buckets):
+            if value <= bound:
+                histogram["buckets"][i] += 1
+        histogram["sum"] += value
+        histogram["count"] += 1
+
+# Function to add to a counter
+def increment(name, value=1, **labels):
+    if not ENABLED:
+        return
+    key = (name, _label_key(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+# Function to set a gauge to its current value
+def set_gauge(name, value, **labels):
+    if not ENABLED:
+        return
+    with _lock:
+        _gauges[name, _label_key(labels)] = value
+
+# Times one stage into lumina_stage_seconds and the current request's timings
+class _StageTimer:
+    __slots__ = ("name", "start")
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.start
+        observe("lumina_stage_seconds", elapsed, stage=self.name)
+        timings = getattr(_local, "timings", None)
+        if timings is not None:
+            timings[self.name] = timings.get(self.name, 0.0) + elapsed
+        return False
+
+# Function to time a block: `with metrics.stage("decode"): ...`. Timers run when metrics are enabled
+# or when this thread is collecting request timings for the UI panel; otherwise it is a no-op.
+def stage(name):
+    if ENABLED or getattr(_local, "timings", None) is not None:
+        return _StageTimer(name)
+    return _NOOP
+
+# Function to start collecting per-stage timings for the request running on this thread
+def begin_request():
+    _local.timings = {}
+
+# Function to get (and stop collecting) this thread's request timings, in seconds per stage
+def end_request():
+    timings = getattr(_local, "timings", None) or {}
+    _local.timings = None
+    return timings
+
+# Function to add timings measured on another thread (an executor worker) to this thread's request
+def add_request_timings(timings):
+    current = getattr(_local, "timings", None)
+    if current is not None:
+        for name, seconds in timings.items():
+            current[name] = current.get(name, 0.0) + seconds
+
+# Function to read the process's peak resident memory in bytes (None where unsupported)
+def peak_rss_bytes():
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+# Function to render every metric in the Prometheus text exposition format
+def render_prometheus():
+    lines = []
+    with _lock:
+        histograms = {key: dict(value, buckets=list(value["buckets"])) for key, value in _histograms.items()}
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+
+    def labels_text(labels, extra=()):
+        pairs = list(labels) + list(extra)
+        return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}" if pairs else ""
+
+    for name, (buckets, help_text) in HISTOGRAMS.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+        for (metric, labels), histogram in sorted(histograms.items()):
+            if metric != name:
+                continue
+            for bound, count in zip(buckets, histogram["buckets"]):
+                lines.append(f"{name}_bucket{labels_text(labels, [('le', bound)])} {count}")
+            lines.append(f"{name}_bucket{labels_text(labels, [('le', '+Inf')])} {histogram['count']}")
+            lines.append(f"{name}_sum{labels_text(labels)} {histogram['sum']}")
+            lines.append(f"{name}_count{labels_text(labels)} {histogram['count']}")
+    for name, help_text in COUNTERS.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+        for (metric, labels), value in sorted(counters.items()):
+            if metric == name:
+                lines.append(f"{name}{labels_text(labels)} {value}")
+    for name, help_text in GAUGES.items():
+        lines += [f"# HELP {name} {help_text}", f"# TYPE {name} gauge"]
+        for (metric, labels), value in sorted(gauges.items()):
+            if metric == name:
+                lines.append(f"{name}{labels_text(labels)} {value}")
+    rss = peak_rss_bytes()
+    if rss is not None:
+        lines += ["# HELP lumina_peak_rss_bytes Peak resident memory of this process",
+                  "# TYPE lumina_peak_rss_bytes gauge", f"lumina_peak_rss_bytes {rss}"]
+    return "\n".join(lines) + "\n"
+
+# Function to summarise the metrics as plain data (used by the metrics file)
+def snapshot():
+    with _lock:
+        histograms = [{"name": name, "labels": dict(labels), "count": value["count"], "sum": value["sum"]}
+                      for (name, labels), value in _histograms.items()]
+        counters = [{"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in _counters.items()]
+        gauges = [{"name": name, "labels": dict(labels), "value": value}
+                  for (name, labels), value in _gauges.items()]
+    return {"time": time.time(), "histograms": histograms, "counters": counters, "gauges": gauges,
+            "peak_rss_bytes": peak_rss_bytes()}
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render_prometheus().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+# Function to serve /metrics for Prometheus on a background thread
+def start_http_exporter(port, host="0.0.0.0"):
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+# Function to append a JSON snapshot to a size-rotated local file every interval seconds
+def start_file_exporter(path, interval=60.0, max_bytes=10 << 20, backups=5):
+    logger = logging.getLogger("lumina.metrics")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.addHandler(logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups))
+
+    def write_snapshots():
+        while True:
+            time.sleep(interval)
+            logger.info(json.dumps(snapshot()))
+
+    threading.Thread(target=write_snapshots, daemon=True).start()
+
+# Function to start the exporters configured by LUMINA_METRICS_PORT / LUMINA_METRICS_FILE (once per process)
+def start_exporters_from_env():
+    global _exporters_started
+    with _lock:
+        if _exporters_started or not ENABLED:
+            return
+        _exporters_started = True
+    if os.environ.get("LUMINA_METRICS_PORT"):
+        start_http_exporter(int(os.environ["LUMINA_METRICS_PORT"]))
+    if os.environ.get("LUMINA_METRICS_FILE"):
+        start_file_exporter(os.environ["LUMINA_METRICS_FILE"],
+                            float(os.environ.get("LUMINA_METRICS_INTERVAL", "60")))
@@ -0,0 +1,254 @@
+import atexit
+import json
+import multiprocessing.util
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+from collections import OrderedDict
+
+import backends
+import metrics
+
+# Default weight file, used for every plant type without its own entry in MODELS_FILE
+MODEL_PATH = "40 Epoch Plant Growth Stage YOLOv8 Model.pt"
+
+_HERE = os.path.dirname(os.path.abspath(__file__))
+# Plant type -> tier -> weight file map, and where per-model use counts are kept between runs
+MODELS_FILE = os.environ.get("LUMINA_MODELS") or os.path.join(_HERE, "models.json")
+USAGE_FILE = os.environ.get("LUMINA_MODEL_USAGE") or os.path.join(_HERE, "model_usage.json")
+# Memory the resident models may take together before the least recently used ones are unloaded
+MEMORY_BUDGET = int(os.environ.get("LUMINA_MODEL_BUDGET_MB", "2048")) << 20
+# Speed/accuracy tiers, fastest first
+TIERS = ("fast", "balanced", "accurate")
+DEFAULT_TIER = "balanced"
+# Seconds between saves of the use counts (they are also saved at exit)
+USAGE_SAVE_SECONDS = 60
+
+# Process-wide model cache keyed by (weight file, backend), shared by every Streamlit session and ordered from
+# least to most recently used. _model_bytes holds the memory each resident model is charged against the budget.
+_models = OrderedDict()
+_model_bytes = {}
+_predict_locks = {}
+_load_lock = threading.Lock()
+_lru_lock = threading.Lock()
+# Guards only _preload_thread, so starting a preload never waits behind a model load in progress
+_preload_lock = threading.Lock()
+_usage_lock = threading.Lock()
+_usage_save_lock = threading.Lock()
+_preload_thread = None
+_backend = backends.DEFAULT_BACKEND
+_model_map = None
+_usage_deltas = {}
+_usage_saved = 0.0
+_exit_save_pid = None
+
+# Function to choose the inference engine used when callers don't name one
+def set_backend(backend):
+    global _backend
+    if backend not in backends.BACKENDS:
+        raise ValueError(f"unknown backend {backend!r}, expected one of {', '.join(backends.BACKENDS)}")
+    _backend = backend
+
+# Function to get the inference engine used when callers don't name one
+def backend():
+    return _backend
+
+# Function to read the plant type -> tier -> weight file map (empty without a models file)
+def model_map():
+    global _model_map
+    if _model_map is None:
+        entries = {}
+        if os.path.exists(MODELS_FILE):
+            with open(MODELS_FILE, encoding="utf-8") as f:
+                entries = json.load(f)
+        for plant_type, tiers in entries.items():
+            unknown = set(tiers) - set(TIERS)
+            if unknown:
+                raise ValueError(f"{MODELS_FILE}: unknown tier(s) {', '.join(sorted(unknown))} for {plant_type}")
+        _model_map = entries
+    return _model_map
+
+# Function to list the tiers a plant type has its own weights for (fastest first)
+def tiers(plant_type):
+    return [tier for tier in TIERS if tier in model_map().get(plant_type, {})]
+
+# Function to pick the weight file for a plant type and tier, falling back to the default tier, then MODEL_PATH
+def resolve_weights(plant_type, tier=None):
+    entry = model_map().get(plant_type, {})
+    return entry.get(tier or DEFAULT_TIER) or entry.get(DEFAULT_TIER) or MODEL_PATH
+
+# Function to run a dummy inference so the first real request skips graph setup
+def warm_up(model, imgsz=640):
+    import numpy as np
+
+    dummy = np.zeros((imgsz, imgsz, 3), dtype=np.uint8)
+    model.predict(source=dummy, save=False, verbose=False)
+
+# Function to read the resident memory of this process (None where /proc is not available)
+def _current_rss():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+# Function to get the size on disk of a weight file or an exported model directory
+def _disk_size(path):
+    if os.path.isdir(path):
+        return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+# Function to unload least recently used models until the resident ones fit the memory budget. The model just
+# loaded always stays; requests still holding an evicted model keep it alive until they finish.
+def _evict(keep):
+    with _lru_lock:
+        while sum(_model_bytes.values()) > MEMORY_BUDGET and len(_models) > 1:
+            key = next(key for key in _models if key != keep)
+            del _models[key]
+            del _model_bytes[key]
+            metrics.increment("lumina_model_evictions_total", backend=key[1])
+        metrics.set_gauge("lumina_model_memory_bytes", sum(_model_bytes.values()))
+
+def _load_usage():
+    try:
+        with open(USAGE_FILE, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+# Function to add the uses counted since the last save to the usage file. Every process that runs models (the
+# app, ingest.py, each CLI worker) adds its own counts under a file lock, re-reading the file first, so
+# concurrent savers never overwrite each other. Runs outside the model locks.
+def _save_usage():
+    with _usage_save_lock:
+        with _usage_lock:
+            deltas = dict(_usage_deltas)
+            _usage_deltas.clear()
+        if not deltas:
+            return
+        try:
+            with open(USAGE_FILE + ".lock", "a") as lock:
+                if fcntl:
+                    fcntl.flock(lock, fcntl.LOCK_EX)
+                usage = _load_usage()
+                for name, count in deltas.items():
+                    usage[name] = usage.get(name, 0) + count
+                temporary = f"{USAGE_FILE}.{os.getpid()}.tmp"
+                with open(temporary, "w", encoding="utf-8") as f:
+                    json.dump(usage, f)
+                os.replace(temporary, USAGE_FILE)
+        except OSError:
+            pass
+
+# Function to make sure this process saves its counts when it exits. Pool worker processes skip atexit handlers
+# but run multiprocessing finalizers; forked children drop the parent's finalizers, so each process registers
+# its own on first use.
+def _register_exit_save():
+    global _exit_save_pid
+    if _exit_save_pid != os.getpid():
+        _exit_save_pid = os.getpid()
+        multiprocessing.util.Finalize(None, _save_usage, exitpriority=10)
+
+# Function to count uses of a model (keyed "weights|backend"), so later runs can preload the most used ones.
+# Called once per request (count = images in a batch) by the detection entry points, not by get_model, so
+# warm-ups, preloads and the passes inside one request are not counted.
+def record_use(weights=MODEL_PATH, backend=None, count=1):
+    global _usage_saved
+    name = f"{weights}|{backend or _backend}"
+    due = False
+    with _usage_lock:
+        _register_exit_save()
+        _usage_deltas[name] = _usage_deltas.get(name, 0) + count
+        if time.monotonic() - _usage_saved > USAGE_SAVE_SECONDS:
+            _usage_saved = time.monotonic()
+            due = True
+    if due:
+        _save_usage()
+
+# Function to load a weight file once per process and reuse it afterwards, within the memory budget
+def get_model(weights=MODEL_PATH, backend=None):
+    key = (weights, backend or _backend)
+    model = _models.get(key)
+    if model is None:
+        with _load_lock:
+            model = _models.get(key)
+            if model is None:
+                # Import the framework first, so the first model is not charged for it
+                try:
+                    import ultralytics  # noqa: F401
+                except ImportError:
+                    pass
+                start = time.perf_counter()
+                rss_before = _current_rss()
+                with metrics.stage("model_load"):
+                    model = backends.load(*key)
+                    warm_up(model)
+                rss_after = _current_rss()
+                metrics.increment("lumina_model_loads_total", backend=key[1])
+                metrics.observe("lumina_model_load_seconds", time.perf_counter() - start)
+                # Charge the model what loading it cost, but never less than its weights
+                grown = rss_after - rss_before if rss_before is not None and rss_after is not None else 0
+                with _lru_lock:
+                    _model_bytes[key] = max(grown, _disk_size(backends.exported_path(*key)))
+                    _predict_locks.setdefault(key, threading.Lock())
+                    _models[key] = model
+                _evict(keep=key)
+    with _lru_lock:
+        if key in _models:
+            _models.move_to_end(key)
+    return model
+
+# Function to check whether a model is resident (so using it needs no load)
+def is_loaded(weights=MODEL_PATH, backend=None):
+    return (weights, backend or _backend) in _models
+
+# Function to run inference on a shared model (predictors are not thread-safe)
+def predict(source, weights=MODEL_PATH, backend=None, **kwargs):
+    key = (weights, backend or _backend)
+    model = get_model(*key)
+    with _predict_locks[key]:
+        return model.predict(source=source, **kwargs)
+
+# Function to start loading and warming up models one after another in the background at startup
+def preload(weights=MODEL_PATH, backend=None, more=()):
+    global _preload_thread
+    keys = [(weights, backend or _backend)] + list(more)
+    with _preload_lock:
+        keys = [key for key in keys if key not in _models]
+        if not keys or (_preload_thread is not None and _preload_thread.is_alive()):
+            return
+        _preload_thread = threading.Thread(target=lambda: [get_model(*key) for key in keys], daemon=True)
+        _preload_thread.start()
+
+# Function to preload the models used most in earlier runs, as many as fit the memory budget by their size on
+# disk and at most `limit` (just MODEL_PATH while there is no usage history yet)
+def preload_most_used(limit=2):
+    keys, total = [], 0
+    for name, _ in sorted(_load_usage().items(), key=lambda item: item[1], reverse=True):
+        weights, _, backend = name.rpartition("|")
+        path = backends.exported_path(weights, backend) if backend in backends.BACKENDS else None
+        if path is None or not os.path.exists(path):
+            continue
+        size = _disk_size(path)
+        if len(keys) >= limit or total + size > MEMORY_BUDGET:
+            break
+        keys.append((weights, backend))
+        total += size
+    if keys:
+        preload(*keys[0], more=keys[1:])
+    else:
+        preload()
+
+# Function to describe the resident models (most recently used last) and the memory they are charged
+def stats():
+    with _lru_lock:
+        return {"models": [{"weights": os.path.basename(weights), "backend": backend,
+                            "mb": round(_model_bytes[weights, backend] / 2**20, 1)} for weights, backend in _models],
+                "used_mb": round(sum(_model_bytes.values()) / 2**20, 1), "budget_mb": MEMORY_BUDGET >> 20}
+
+atexit.register(_save_usage)
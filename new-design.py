@@ -1,7 +1,7 @@
 import streamlit as st
 import cv2
 import numpy as np
-from ultralytics import YOLO
+import model_registry
 
 # Define the label map
 label_map = {
@@ -61,6 +61,7 @@ def get_system_response(plant_type, growth_stage):
 # Streamlit app
 def main():
     st.set_page_config(layout="wide", page_title="Lumina Flora")
+    model_registry.preload()
 
     st.markdown("""
         <style>
@@ -97,8 +98,8 @@ def main():
 
                 if st.button("Detect Growth Stage"):
                     with st.spinner("Processing..."):
-                        model = YOLO("40 Epoch Plant Growth Stage YOLOv8 Model.pt")
-                        results = model.predict(source=image, save=False, conf=0.25)
+                        model = model_registry.get_model()
+                        results = model_registry.predict(image, save=False, conf=0.25)
 
                     detection_results = []
                     annotated_image = original_image.copy()
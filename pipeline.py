@@ -0,0 +1,358 @@
+import io
+import threading
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+from PIL import Image
+
+import metrics
+import model_registry
+from annotation import render_annotations
+from profiles import profiles
+from tiling import merge_detections, tile_grid
+
+# File types accepted by the uploaders and inside zip archives
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png")
+
+# Uploads are decoded at reduced resolution while their long side stays at least this big
+# (2x the 640px model input, so detection accuracy is unaffected)
+DECODE_MIN_SIDE = 1280
+# Sliced inference keeps far more pixels: images up to 8K decode at full resolution
+TILED_DECODE_MIN_SIDE = 4096
+
+# Bytes read when sniffing an image header for its size, and the EXIF orientation tag
+HEADER_BYTES = 1 << 18
+EXIF_ORIENTATION = 0x0112
+
+# Pixels per strip in the fast Thurinus path (keeps the working set in cache)
+THURINUS_STRIP_PIXELS = 1 << 16
+
+# Define the label map
+label_map = {
+    'Flowering': 'Growing',
+    'Vegetative': 'Growing',
+    'Germination': 'Germination',
+    'Harvesting': 'Harvesting'
+}
+
+# Function to preprocess image for Thurinus Lettuce
+def preprocess_thurinus(image):
+    hsv_img = cv2.cvtColor(image, cv2.COLOR_BGR2HSV)
+    hsv_img[:, :, 0] = 60  # Change hue to a greenish value
+    green_hued_img = cv2.cvtColor(hsv_img, cv2.COLOR_HSV2BGR)
+    return green_hued_img
+
+# With the hue pinned to 60 the HSV round trip maps each pixel to (p, max, p), where p
+# depends only on the pixel's max and min channel, so it can be tabulated once. OpenCV converts
+# each row in SIMD blocks and the last (width % block) pixels with scalar code that rounds up to
+# 1 level differently, so there is one table per path and the block size is probed at startup.
+_thurinus_tables = None
+_thurinus_pool = None
+_thurinus_pool_lock = threading.Lock()
+
+# Function to build the (max, min) -> p lookup tables from the reference implementation. Returns
+# (vector table, scalar table, SIMD block in pixels; 0 when every pixel takes the scalar path).
+def get_thurinus_tables():
+    global _thurinus_tables
+    if _thurinus_tables is None:
+        high, low = np.meshgrid(np.arange(256), np.arange(256), indexing="ij")
+        low = np.minimum(low, high)
+        grid = np.stack([high, low, low], axis=2).astype(np.uint8)
+        vector = preprocess_thurinus(grid)[:, :, 0].ravel().copy()
+        # One pixel per row never fills a SIMD block
+        scalar = preprocess_thurinus(grid.reshape(-1, 1, 3))[:, 0, 0].copy()
+        # Fill a 127-pixel row with a colour the paths disagree on; where the scalar result starts
+        # is where the row tail starts, and the block is the next power of two above its length
+        block = 0
+        differing = np.flatnonzero(vector != scalar)
+        if len(differing):
+            row = np.broadcast_to(grid.reshape(-1, 3)[differing[0]], (1, 127, 3)).copy()
+            tail = int((preprocess_thurinus(row)[0, :, 0] == scalar[differing[0]]).sum())
+            block = 1 << tail.bit_length() if tail < 127 else 0
+        _thurinus_tables = (vector, scalar, block)
+    return _thurinus_tables
+
+# Function to get the vectorised-path lookup table
+def get_thurinus_lut():
+    return get_thurinus_tables()[0]
+
+# Function to apply the lookup table to a band of rows, one cache-sized strip at a time
+def _thurinus_band(image, out, tables):
+    lut, scalar_lut, block = tables
+    height, width = image.shape[:2]
+    tail = width % block if block else width
+    rows = max(1, min(height, THURINUS_STRIP_PIXELS // width))
+    blue, green, red, high, low, hue_fixed = (np.empty((rows, width), np.uint8) for _ in range(6))
+    index = np.empty((rows, width), np.intp)
+    for y in range(0, height, rows):
+        n = min(rows, height - y)
+        cv2.split(image[y:y + n], [blue[:n], green[:n], red[:n]])
+        cv2.max(blue[:n], green[:n], dst=high[:n])
+        cv2.max(high[:n], red[:n], dst=high[:n])
+        cv2.min(blue[:n], green[:n], dst=low[:n])
+        cv2.min(low[:n], red[:n], dst=low[:n])
+        np.left_shift(high[:n], 8, out=index[:n], dtype=np.intp)
+        np.bitwise_or(index[:n], low[:n], out=index[:n])
+        lut.take(index[:n], out=hue_fixed[:n])
+        if tail:
+            hue_fixed[:n, width - tail:] = scalar_lut.take(index[:n, width - tail:])
+        cv2.merge([hue_fixed[:n], high[:n], hue_fixed[:n]], dst=out[y:y + n])
+
+# Function to get the shared thread pool used to split large images into bands
+def _get_thurinus_pool():
+    global _thurinus_pool
+    with _thurinus_pool_lock:
+        if _thurinus_pool is None:
+            _thurinus_pool = ThreadPoolExecutor(max_workers=max(1, cv2.getNumThreads()))
+        return _thurinus_pool
+
+# Fast path for preprocess_thurinus: one table lookup per pixel instead of two colour
+# conversions, optionally written into a preallocated output buffer. Identical to the reference,
+# row tails included (check_thurinus.py verifies it).
+def preprocess_thurinus_fast(image, out=None):
+    image = np.ascontiguousarray(image)
+    if out is None:
+        out = np.empty_like(image)
+    tables = get_thurinus_tables()
+    height = image.shape[0]
+    bands = max(1, min(cv2.getNumThreads(), height // 64))
+    if bands == 1:
+        _thurinus_band(image, out, tables)
+        return out
+
+    step = -(-height // bands)
+    pool = _get_thurinus_pool()
+    futures = [pool.submit(_thurinus_band, image[y:y + step], out[y:y + step], tables)
+               for y in range(0, height, step)]
+    for future in futures:
+        future.result()
+    return out
+
+# Function to apply the fast Thurinus path to a batch (an N x H x W x 3 array or a list)
+def preprocess_thurinus_batch(images, out=None):
+    if isinstance(images, np.ndarray):
+        images = np.ascontiguousarray(images)
+        if out is None:
+            out = np.empty_like(images)
+        rows = images.reshape(-1, *images.shape[2:])
+        preprocess_thurinus_fast(rows, out.reshape(rows.shape))
+        return out
+    if out is None:
+        out = [None] * len(images)
+    for i, image in enumerate(images):
+        out[i] = preprocess_thurinus_fast(image, out[i])
+    return out
+
+# Function to provide system response based on growth stage and plant type (from the profile index)
+def get_system_response(plant_type, growth_stage):
+    return profiles.settings(plant_type, growth_stage)
+
+# Function to decode uploaded image bytes into a BGR image (None if unreadable)
+def decode_image(data):
+    file_bytes = np.frombuffer(data, dtype=np.uint8)
+    return cv2.imdecode(file_bytes, cv2.IMREAD_COLOR)
+
+# Function to read an image's (EXIF-oriented) width and height from its header without decoding it
+def image_size(data):
+    view = memoryview(data)
+    for prefix in (view[:HEADER_BYTES], view):
+        try:
+            with Image.open(io.BytesIO(prefix)) as header:
+                width, height = header.size
+                if header.getexif().get(EXIF_ORIENTATION, 1) in (5, 6, 7, 8):
+                    width, height = height, width
+                return width, height
+        except (OSError, SyntaxError, ValueError):
+            continue
+    return None
+
+# Function to decode an upload at the smallest JPEG scale (1/2, 1/4, 1/8) whose long side stays at
+# least min_side. Returns the image and the (x, y) factors mapping its pixels back to the original.
+def decode_reduced(data, min_side=DECODE_MIN_SIDE):
+    with metrics.stage("decode"):
+        file_bytes = np.frombuffer(data, dtype=np.uint8)
+        size = image_size(data)
+        flag = cv2.IMREAD_COLOR
+        if size is not None:
+            metrics.observe("lumina_image_megapixels", size[0] * size[1] / 1e6)
+            for factor, reduced_flag in ((8, cv2.IMREAD_REDUCED_COLOR_8), (4, cv2.IMREAD_REDUCED_COLOR_4),
+                                         (2, cv2.IMREAD_REDUCED_COLOR_2)):
+                if max(size) // factor >= min_side:
+                    flag = reduced_flag
+                    break
+        image = cv2.imdecode(file_bytes, flag)
+    if image is None:
+        return None, (1.0, 1.0)
+    if size is None:
+        return image, (1.0, 1.0)
+    return image, (size[0] / image.shape[1], size[1] / image.shape[0])
+
+# Function to map detections found on a reduced image back to original-resolution coordinates
+def scale_detections(detections, scale):
+    scale_x, scale_y = scale
+    if scale_x == 1.0 and scale_y == 1.0:
+        return detections
+    scaled = []
+    for detection in detections:
+        x1, y1, x2, y2 = detection['Bounding Box']
+        scaled.append(dict(detection, **{'Bounding Box': (int(x1 * scale_x), int(y1 * scale_y),
+                                                          int(x2 * scale_x), int(y2 * scale_y))}))
+    return scaled
+
+# Function to shrink a BGR image to at most the given width
+def thumbnail(image, width):
+    if image.shape[1] <= width:
+        return image
+    height = max(1, round(image.shape[0] * width / image.shape[1]))
+    return cv2.resize(image, (width, height), interpolation=cv2.INTER_AREA)
+
+# Function to encode a BGR image as JPEG bytes for display and caching
+def encode_jpeg(image, quality=90):
+    with metrics.stage("encode"):
+        ok, buffer = cv2.imencode(".jpg", image, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not ok:
+        raise ValueError("could not encode image as JPEG")
+    return buffer.tobytes()
+
+# Function to apply the plant-specific preprocessing before detection
+def preprocess(image, plant_type):
+    if plant_type == "Thurinus Lettuce":
+        with metrics.stage("preprocess"):
+            return preprocess_thurinus_fast(image)
+    return image
+
+# Function to expand uploaded files (images or zip archives) into (name, bytes) pairs
+def expand_uploads(uploaded_files):
+    for uploaded_file in uploaded_files:
+        data = uploaded_file.read()
+        if uploaded_file.name.lower().endswith(".zip"):
+            with zipfile.ZipFile(io.BytesIO(data)) as archive:
+                for member in archive.infolist():
+                    if not member.is_dir() and member.filename.lower().endswith(IMAGE_EXTENSIONS):
+                        yield member.filename, archive.read(member)
+        else:
+            yield uploaded_file.name, data
+
+# Function to decode (at reduced resolution) and preprocess many images concurrently (cv2 releases the GIL)
+def prepare_images(named_bytes, plant_type, max_workers=None):
+    def prepare(item):
+        name, data = item
+        original_image, scale = decode_reduced(data)
+        if original_image is None:
+            return name, None, None, scale
+        return name, original_image, preprocess(original_image, plant_type), scale
+
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(prepare, named_bytes))
+
+# Function to get one YOLO result's x1, y1, x2, y2, confidence, class id rows as an (N, 6) array
+def result_rows(result):
+    data = result.boxes.data
+    return data.cpu().numpy() if hasattr(data, "cpu") else np.asarray(data)
+
+# Function to convert one YOLO result into the detection dicts shown in the UI
+def parse_detections(result, names):
+    return to_detections(result_rows(result).tolist(), names)
+
+# Function to build detection dicts (with the label_map mapping) from x1, y1, x2, y2, confidence, class id rows
+def to_detections(rows, names):
+    detections = []
+    for x1, y1, x2, y2, confidence, class_id in rows:
+        class_name = names[int(class_id)]
+        detections.append({
+            'Label': label_map.get(class_name, class_name),
+            'Confidence': round(confidence, 2),
+            'Bounding Box': tuple(map(int, (x1, y1, x2, y2)))
+        })
+    return detections
+
+# Function to count images and detections per image for the metrics
+def record_detections(per_image):
+    if metrics.ENABLED:
+        metrics.increment("lumina_images_total", len(per_image))
+        for detections in per_image:
+            metrics.observe("lumina_detections_per_image", len(detections))
+
+# Function to run detection over many images in fixed-size batches
+def detect_batch(images, conf=0.25, batch_size=8, weights=model_registry.MODEL_PATH):
+    model = model_registry.get_model(weights)
+    model_registry.record_use(weights, count=len(images))
+    detections = []
+    for start in range(0, len(images), batch_size):
+        with metrics.stage("inference"):
+            results = model_registry.predict(images[start:start + batch_size], weights,
+                                             save=False, conf=conf, verbose=False)
+        detections.extend(parse_detections(result, model.names) for result in results)
+    record_detections(detections)
+    return detections
+
+# Function to draw detections on a copy of the image (or on a display_width-wide canvas). detections is either
+# a list of detection dicts or an (N, 6) array of x1, y1, x2, y2, confidence, class id rows (result_rows,
+# detect_windows) together with the model's names; arrays go to the renderer as they are.
+def annotate_image(image, detections, display_width=None, names=None):
+    if isinstance(detections, np.ndarray):
+        rows = detections.reshape(-1, 6)
+        boxes, confidences, class_ids = rows[:, :4], rows[:, 4], rows[:, 5].astype(np.intp)
+        labels = {class_id: label_map.get(name, name) for class_id, name in names.items()}
+    else:
+        labels = sorted({detection['Label'] for detection in detections})
+        index = {label: class_id for class_id, label in enumerate(labels)}
+        boxes = np.array([detection['Bounding Box'] for detection in detections], dtype=np.float64).reshape(-1, 4)
+        confidences = np.fromiter((detection['Confidence'] for detection in detections), np.float64,
+                                  len(detections))
+        class_ids = np.fromiter((index[detection['Label']] for detection in detections), np.intp, len(detections))
+    with metrics.stage("annotation"):
+        return render_annotations(image, boxes, confidences, class_ids, labels, display_width)
+
+# Function to run the full detection flow (preprocess, predict, label_map) on one decoded image. Callers that
+# already hold the preprocessed image pass it as `preprocessed` to skip that step.
+def detect_image(original_image, plant_type, conf=0.25, weights=model_registry.MODEL_PATH, preprocessed=None):
+    image = preprocess(original_image, plant_type) if preprocessed is None else preprocessed
+    model = model_registry.get_model(weights)
+    model_registry.record_use(weights)
+    with metrics.stage("inference"):
+        results = model_registry.predict(image, weights, save=False, conf=conf, verbose=False)
+    detections = parse_detections(results[0], model.names)
+    record_detections([detections])
+    return detections
+
+# Function to detect on windows (x1, y1, x2, y2) of an already preprocessed image, in batches. Returns an (N, 6)
+# array of x1, y1, x2, y2, confidence, class id rows in image coordinates, before any label_map mapping.
+def detect_windows(image, windows, conf=0.25, weights=model_registry.MODEL_PATH, batch_size=8):
+    rows = [np.empty((0, 6), dtype=np.float32)]
+    for start in range(0, len(windows), batch_size):
+        batch = windows[start:start + batch_size]
+        with metrics.stage("inference"):
+            results = model_registry.predict([image[y1:y2, x1:x2] for x1, y1, x2, y2 in batch], weights,
+                                             save=False, conf=conf, verbose=False)
+        for (x1, y1, _, _), result in zip(batch, results):
+            window_rows = np.asarray(result.boxes.data.tolist(), dtype=np.float32).reshape(-1, 6)
+            window_rows[:, [0, 2]] += x1
+            window_rows[:, [1, 3]] += y1
+            rows.append(window_rows)
+    return np.concatenate(rows)
+
+# Function to run sliced inference on a large image. Overlapping tiles go through the model in batches
+# (plus one whole-image pass for plants bigger than a tile); their boxes are shifted back to image
+# coordinates and merged across tiles before the label_map mapping.
+def detect_tiled(original_image, plant_type, conf=0.25, weights=model_registry.MODEL_PATH, tile_size=640,
+                 overlap=0.2, batch_size=8, full_image=True, merge_threshold=0.5, preprocessed=None):
+    image = preprocess(original_image, plant_type) if preprocessed is None else preprocessed
+    height, width = image.shape[:2]
+    windows = tile_grid(width, height, tile_size, overlap)
+    model = model_registry.get_model(weights)
+    model_registry.record_use(weights)
+
+    rows = [detect_windows(image, windows, conf, weights, batch_size)]
+    if full_image and len(windows) > 1:
+        rows.append(detect_windows(image, [(0, 0, width, height)], conf, weights))
+    detections = to_detections(merge_detections(np.concatenate(rows), merge_threshold).tolist(), model.names)
+    record_detections([detections])
+    return detections
+
+# Function to attach the device settings for each detection's growth stage
+def with_settings(plant_type, detections):
+    return [dict(detection, Settings=get_system_response(plant_type, detection['Label']))
+            for detection in detections]
@@ -0,0 +1,151 @@
+import json
+import os
+import threading
+import time
+
+# Plant type x growth stage device profiles, overridable from the environment
+DEFAULT_PATH = os.environ.get("LUMINA_PROFILES") or os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                                 "profiles.json")
+# Seconds between checks of the profile file for changes
+RELOAD_INTERVAL = 1.0
+
+# Function to format a numeric range the way the settings have always been shown ("15,000-20,000 lux")
+def _format_range(low, high, unit):
+    return f"{low:,g}-{high:,g}{unit}"
+
+# Function to read one [low, high] pair from a profile entry
+def _read_range(entry, field, where):
+    try:
+        low, high = (float(value) for value in entry[field])
+    except (KeyError, TypeError, ValueError):
+        raise ValueError(f"{where}: '{field}' must be a [low, high] pair of numbers") from None
+    if low > high:
+        raise ValueError(f"{where}: '{field}' low {low:g} is above high {high:g}")
+    return low, high
+
+# Function to validate the raw profile file and compile it into a flat (plant type, stage) -> profile index.
+# Each profile carries its numeric setpoints and the display strings the UI and CSV output have always used.
+def compile_profiles(raw):
+    index = {}
+    for plant_type, stages in raw.items():
+        for stage, entry in stages.items():
+            where = f"{plant_type} / {stage}"
+            lux = _read_range(entry, "lux", where)
+            temperature = _read_range(entry, "temperature_c", where)
+            try:
+                light_color = str(entry["light_color"])
+                red_ratio, blue_ratio = float(entry["red_ratio"]), float(entry["blue_ratio"])
+            except (KeyError, TypeError, ValueError):
+                raise ValueError(f"{where}: needs light_color, red_ratio and blue_ratio") from None
+            index[plant_type, stage] = {
+                "light_color": light_color,
+                "red_ratio": red_ratio,
+                "blue_ratio": blue_ratio,
+                "lux": lux,
+                "temperature_c": temperature,
+                "settings": {
+                    "light_color": light_color,
+                    "light_intensity": _format_range(*lux, " lux"),
+                    "temperature": _format_range(*temperature, "°C"),
+                },
+            }
+    return index
+
+# Profile index loaded once from the data file and reloaded when the file changes on disk. A file that fails
+# to load is reported in `error` and the previous index stays in use.
+class ProfileIndex:
+    def __init__(self, path=DEFAULT_PATH, reload_interval=RELOAD_INTERVAL):
+        self.path = path
+        self.reload_interval = reload_interval
+        self.error = None
+        self.lock = threading.Lock()
+        self.profiles, self.mtime = self._load()
+        self.checked = time.monotonic()
+
+    def _load(self):
+        mtime = os.stat(self.path).st_mtime_ns
+        with open(self.path, encoding="utf-8") as f:
+            return compile_profiles(json.load(f)), mtime
+
+    # Function to reload the file if it changed (checked at most once per reload_interval)
+    def refresh(self, force=False):
+        now = time.monotonic()
+        if not force and now - self.checked < self.reload_interval:
+            return
+        with self.lock:
+            self.checked = now
+            try:
+                if force or os.stat(self.path).st_mtime_ns != self.mtime:
+                    self.profiles, self.mtime = self._load()
+                    self.error = None
+            except (OSError, ValueError) as error:
+                self.error = f"{self.path}: {error}"
+
+    # Function to look up the compiled profile for a plant type and stage (None if there is none)
+    def get(self, plant_type, stage):
+        self.refresh()
+        return self.profiles.get((plant_type, stage))
+
+    # Function to get the display settings (light color, intensity, temperature strings) for a stage
+    def settings(self, plant_type, stage):
+        profile = self.get(plant_type, stage)
+        return profile["settings"] if profile else {}
+
+# Function to count the detections and sum their confidence per growth stage; returns (counts, weights)
+def stage_totals(detections):
+    counts, weights = {}, {}
+    for detection in detections:
+        label = detection['Label']
+        counts[label] = counts.get(label, 0) + 1
+        weights[label] = weights.get(label, 0.0) + detection['Confidence']
+    return counts, weights
+
+# Function to find the dominant growth stage (highest summed confidence) from stage_totals weights
+def dominant_stage(weights):
+    return max(weights, key=weights.get) if weights else None
+
+# Function to reduce all detections in an image to one setpoint decision. Each stage is weighted by the summed
+# confidence of its boxes; the numeric setpoints blend the stage profiles by that weight, and the light color
+# follows the dominant stage. Returns None when nothing was detected. The boxes are read once, so anything
+# rendered or sent to a device from the result costs O(stages), not O(boxes).
+def aggregate(plant_type, detections, index=None):
+    index = index or profiles
+    counts, weights = stage_totals(detections)
+    if not counts:
+        return None
+
+    total = sum(weights.values()) or 1.0
+    distribution = {stage: weight / total for stage, weight in weights.items()}
+    stage = dominant_stage(weights)
+    setpoint = {"stage": stage, "counts": counts,
+                "distribution": {name: round(share, 3) for name, share in distribution.items()}}
+
+    known = {name: (share, index.get(plant_type, name)) for name, share in distribution.items()}
+    known = {name: value for name, value in known.items() if value[1] is not None}
+    known_total = sum(share for share, _ in known.values())
+    if not known_total:
+        return setpoint
+
+    def blend(field):
+        return sum(share * profile[field] for share, profile in known.values()) / known_total
+
+    def blend_range(field):
+        low = sum(share * profile[field][0] for share, profile in known.values()) / known_total
+        high = sum(share * profile[field][1] for share, profile in known.values()) / known_total
+        return low, high
+
+    lux, temperature = blend_range("lux"), blend_range("temperature_c")
+    dominant = index.get(plant_type, stage) or max(known.values(), key=lambda value: value[0])[1]
+    setpoint.update(
+        light_color=dominant["light_color"],
+        red_ratio=round(blend("red_ratio"), 3),
+        blue_ratio=round(blend("blue_ratio"), 3),
+        lux=round(sum(lux) / 2),
+        lux_range=[round(lux[0]), round(lux[1])],
+        temperature_c=round(sum(temperature) / 2, 1),
+        temperature_range_c=[round(temperature[0], 1), round(temperature[1], 1)],
+    )
+    return setpoint
+
+# Process-wide profile index shared by every Streamlit session
+profiles = ProfileIndex()
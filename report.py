@@ -0,0 +1,187 @@
+import argparse
+import base64
+import html
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from cli import bounded_map
+from pipeline import annotate_image, decode_reduced, encode_jpeg, get_system_response, scale_detections, thumbnail
+from profiles import aggregate
+
+# Contact sheet layout: thumbnails of THUMB_WIDTH pixels, COLUMNS across and up to ROWS down per sheet
+THUMB_WIDTH = 240
+COLUMNS = 6
+ROWS = 5
+CAPTION_HEIGHT = 18
+BACKGROUND = (255, 255, 255)
+
+# Function to load detection records (cli.py or ingest.py JSONL) grouped by tray: the record's source, or the
+# directory of its path. Returns {tray: {"plant_type", "images": [(path, detections)]}} in first-seen order;
+# records without detections (unreadable images) are counted as failed.
+def load_records(paths):
+    trays = {}
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                tray = trays.setdefault(record.get("source") or os.path.dirname(record["path"]) or ".",
+                                        {"plant_type": record.get("plant_type"), "images": [], "failed": 0})
+                # Error records (unreadable images) may carry no plant type; take it from any record that has one
+                tray["plant_type"] = tray["plant_type"] or record.get("plant_type")
+                if "detections" not in record:
+                    tray["failed"] += 1
+                    continue
+                tray["images"].append((record["path"], [{key: detection[key] for key in
+                                                         ("Label", "Confidence", "Bounding Box")}
+                                                        for detection in record["detections"]]))
+    return trays
+
+# Function to build one annotated thumbnail inside a worker. Images are decoded at reduced resolution (only as
+# big as the thumbnail needs), so no full-resolution image is ever held. Returns None for unreadable files.
+def annotated_thumbnail(item):
+    path, detections, width = item
+    try:
+        with open(path, "rb") as f:
+            image, scale = decode_reduced(f.read(), width * 2)
+    except OSError:
+        return None
+    if image is None:
+        return None
+    return annotate_image(image, scale_detections(detections, (1 / scale[0], 1 / scale[1])), width)
+
+# Function to set up one worker process (single-threaded OpenCV; the parallelism comes from the processes)
+def init_worker():
+    cv2.setNumThreads(1)
+
+# Function to tile thumbnails into one contact sheet image, each cell letterboxed with a caption below
+def contact_sheet(thumbnails, captions, columns=COLUMNS, width=THUMB_WIDTH):
+    cell_height = width * 3 // 4
+    rows = (len(thumbnails) + columns - 1) // columns
+    sheet = np.full((rows * (cell_height + CAPTION_HEIGHT), columns * width, 3), BACKGROUND, dtype=np.uint8)
+    for index, (image, caption) in enumerate(zip(thumbnails, captions)):
+        top, left = index // columns * (cell_height + CAPTION_HEIGHT), index % columns * width
+        if image is not None:
+            # Letterbox: shrink to fit the cell (portrait shots are taller than the cell), keeping the aspect
+            fit = min(width / image.shape[1], cell_height / image.shape[0])
+            if fit < 1:
+                image = cv2.resize(image, (max(1, round(image.shape[1] * fit)), max(1, round(image.shape[0] * fit))),
+                                   interpolation=cv2.INTER_AREA)
+            y, x = top + (cell_height - image.shape[0]) // 2, left + (width - image.shape[1]) // 2
+            sheet[y:y + image.shape[0], x:x + image.shape[1]] = image
+        cv2.putText(sheet, caption[:width // 7], (left + 4, top + cell_height + CAPTION_HEIGHT - 5),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.4, (40, 40, 40), 1, cv2.LINE_AA)
+    return sheet
+
+# Writes the report as one self-contained HTML file (contact sheets embedded as JPEG data URIs), tray by
+# tray and sheet by sheet, so only the sheet being written is held in memory
+class ReportWriter:
+    def __init__(self, stream, title):
+        self.stream = stream
+        stream.write(f"<!DOCTYPE html>\n<html><head><meta charset='utf-8'><title>{html.escape(title)}</title>"
+                     "<style>body{font-family:sans-serif;color:#34495E;margin:2em}h1,h2{color:#117A65}"
+                     "table{border-collapse:collapse;margin:0.5em 0}td,th{border:1px solid #ccc;padding:2px 8px}"
+                     "img{max-width:100%;display:block;margin:0.5em 0}</style></head><body>\n"
+                     f"<h1>{html.escape(title)}</h1>\n")
+
+    # Function to write a tray's heading, its aggregated setpoint and stage counts
+    def begin_tray(self, tray, plant_type, images, failed, setpoint):
+        write = self.stream.write
+        write(f"<h2>{html.escape(tray)}</h2>\n<p>{html.escape(plant_type or 'Unknown plant type')}: {images} images"
+              + (f", {failed} unreadable" if failed else "") + "</p>\n")
+        if setpoint is None:
+            write("<p>No growth stages detected.</p>\n")
+            return
+        settings = get_system_response(plant_type, setpoint["stage"])
+        rows = [("Growth stage", f"{setpoint['stage']} ({setpoint['distribution'][setpoint['stage']]:.0%})")]
+        rows += [(name.replace("_", " ").capitalize(), value) for name, value in settings.items()]
+        if "lux" in setpoint:
+            rows += [("Setpoint", f"{setpoint['light_color']}, red {setpoint['red_ratio']:.0%} / blue "
+                                  f"{setpoint['blue_ratio']:.0%}, {setpoint['lux']:,} lux, "
+                                  f"{setpoint['temperature_c']:g}°C")]
+        write("<table>" + "".join(f"<tr><th>{html.escape(name)}</th><td>{html.escape(str(value))}</td></tr>"
+                                  for name, value in rows) + "</table>\n")
+        write("<table><tr><th>Stage</th><th>Detections</th><th>Share of confidence</th></tr>"
+              + "".join(f"<tr><td>{html.escape(stage)}</td><td>{count}</td>"
+                        f"<td>{setpoint['distribution'][stage]:.0%}</td></tr>"
+                        for stage, count in sorted(setpoint["counts"].items())) + "</table>\n")
+
+    def write_sheet(self, sheet, caption):
+        self.stream.write(f"<img alt='{html.escape(caption)}' src='data:image/jpeg;base64,"
+                          f"{base64.b64encode(encode_jpeg(sheet, quality=80)).decode('ascii')}'>\n")
+
+    def close(self):
+        self.stream.write("</body></html>\n")
+
+# Function to write every tray section, taking the thumbnails (in tray order) from an iterator
+def _write_trays(writer, trays, thumbnails, columns, rows, width):
+    per_sheet = columns * rows
+    count = 0
+    for name, tray in trays.items():
+        images = tray["images"]
+        writer.begin_tray(name, tray["plant_type"], len(images), tray["failed"],
+                          aggregate(tray["plant_type"], [detection for _, detections in images
+                                                         for detection in detections]))
+        for start in range(0, len(images), per_sheet):
+            batch = images[start:start + per_sheet]
+            sheet = contact_sheet([next(thumbnails) for _ in batch],
+                                  [f"{os.path.basename(path)} ({len(detections)})" for path, detections in batch],
+                                  columns, width)
+            writer.write_sheet(sheet, f"{name} {start + 1}-{start + len(batch)}")
+            count += len(batch)
+    writer.close()
+    return count
+
+# Function to build the report for grouped records. Thumbnails are made in parallel across worker processes,
+# in order and with a bounded number in flight; each sheet is written as soon as its thumbnails are in.
+def write_report(trays, stream, image_dir=None, title="Lumina Flora Report", workers=None, columns=COLUMNS,
+                 rows=ROWS, width=THUMB_WIDTH):
+    items = ((os.path.join(image_dir, path) if image_dir else path, detections, width)
+             for tray in trays.values() for path, detections in tray["images"])
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as pool:
+        thumbnails = bounded_map(pool, annotated_thumbnail, items, (workers or os.cpu_count() or 1) * 4)
+        return _write_trays(ReportWriter(stream, title), trays, thumbnails, columns, rows, width)
+
+# Function to build the report from the web app's batch results ((name, annotated JPEG preview, detections)),
+# reusing their already annotated previews. Images in a zip subdirectory form their own tray.
+def write_preview_report(results, plant_type, stream, title="Lumina Flora Report", tray="upload", columns=COLUMNS,
+                         rows=ROWS, width=THUMB_WIDTH):
+    trays, previews = {}, {}
+    for name, preview, detections in results:
+        key = os.path.dirname(name) or tray
+        entry = trays.setdefault(key, {"plant_type": plant_type, "images": [], "failed": 0})
+        entry["images"].append((name, detections))
+        previews.setdefault(key, []).append(preview)
+    thumbnails = (thumbnail(cv2.imdecode(np.frombuffer(preview, dtype=np.uint8), cv2.IMREAD_COLOR), width)
+                  for key in trays for preview in previews[key])
+    return _write_trays(ReportWriter(stream, title), trays, thumbnails, columns, rows, width)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build an HTML report with annotated contact sheets per tray.")
+    parser.add_argument("results", nargs="+", help="Detection results (JSONL from cli.py or ingest.py)")
+    parser.add_argument("--images", help="Directory the result paths are relative to (the cli.py input_dir)")
+    parser.add_argument("--output", default="report.html", help="HTML file to write")
+    parser.add_argument("--title", default="Lumina Flora Report")
+    parser.add_argument("--columns", type=int, default=COLUMNS, help="Thumbnails per contact sheet row")
+    parser.add_argument("--rows", type=int, default=ROWS, help="Rows per contact sheet")
+    parser.add_argument("--thumb-width", type=int, default=THUMB_WIDTH, help="Thumbnail width in pixels")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Number of worker processes")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    trays = load_records(args.results)
+    with open(args.output, "w", encoding="utf-8") as stream:
+        count = write_report(trays, stream, args.images, args.title, args.workers, args.columns, args.rows,
+                             args.thumb_width)
+    elapsed = time.perf_counter() - start
+    print(f"Wrote {count} images from {len(trays)} trays to {args.output} in {elapsed:.1f}s", file=sys.stderr)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+# Defaults for the process-wide cache, overridable from the environment
+DEFAULT_MAX_MB = int(os.environ.get("LUMINA_CACHE_MB", "256"))
+DEFAULT_DISK_DIR = os.environ.get("LUMINA_CACHE_DIR") or None
+DEFAULT_DISK_MAX_MB = int(os.environ.get("LUMINA_CACHE_DISK_MB", "2048"))
+
+# Content-addressed cache of detection results with LRU eviction and an optional disk store.
+# Entries are {"detections": [...], "annotated": <JPEG bytes>, "preview": <JPEG bytes>}.
+class ResultCache:
+    def __init__(self, max_bytes=DEFAULT_MAX_MB << 20, disk_dir=None, disk_max_bytes=DEFAULT_DISK_MAX_MB << 20):
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.disk_max_bytes = disk_max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+        # Bytes each disk entry takes and their total, counted once at startup and kept up to date by _save,
+        # so the disk directory is only listed again when it goes over budget
+        self.disk_sizes = {}
+        self.disk_size = 0
+        self.disk_lock = threading.Lock()
+        if disk_dir:
+            os.makedirs(disk_dir, exist_ok=True)
+            self.disk_sizes = {key: size for _, key, size in self._disk_entries()}
+            self.disk_size = sum(self.disk_sizes.values())
+
+    # Function to build the cache key from the uploaded bytes and everything that affects the result. The model
+    # is identified by its inference backend, full weight path and modification time, so retrained weights
+    # saved under the same name (or the same name in another directory) never serve stale results.
+    @staticmethod
+    def key(data, plant_type, conf, weights, *options, backend=None):
+        try:
+            mtime = os.stat(weights).st_mtime_ns
+        except OSError:
+            mtime = None
+        digest = hashlib.sha256(data)
+        digest.update(f"\0{plant_type}\0{conf}\0{backend}\0{os.path.abspath(weights)}\0{mtime}".encode())
+        for option in options:
+            digest.update(f"\0{option}".encode())
+        return digest.hexdigest()
+
+    # Function to look up a result in memory, then on disk
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry
+
+        entry = self._load(key) if self.disk_dir else None
+        with self.lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.disk_hits += 1
+            self._insert(key, entry)
+        return entry
+
+    # Function to store a result in memory (and on disk when persistence is enabled)
+    def put(self, key, detections, annotated, preview=b""):
+        entry = {"detections": detections, "annotated": annotated, "preview": preview}
+        with self.lock:
+            self._insert(key, entry)
+        if self.disk_dir:
+            self._save(key, entry)
+        return entry
+
+    # Function to report the counters shown in the UI
+    def stats(self):
+        with self.lock:
+            return {"hits": self.hits, "disk_hits": self.disk_hits, "misses": self.misses,
+                    "evictions": self.evictions, "entries": len(self.entries), "bytes": self.size}
+
+    def _insert(self, key, entry):
+        if key in self.entries:
+            self.size -= _entry_size(self.entries.pop(key))
+        entry_size = _entry_size(entry)
+        if entry_size > self.max_bytes:
+            return
+        self.entries[key] = entry
+        self.size += entry_size
+        while self.size > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= _entry_size(evicted)
+            self.evictions += 1
+
+    def _paths(self, key):
+        base = os.path.join(self.disk_dir, key)
+        return base + ".json", base + ".jpg", base + ".preview.jpg"
+
+    def _load(self, key):
+        json_path, image_path, preview_path = self._paths(key)
+        try:
+            with open(json_path, encoding="utf-8") as f:
+                detections = json.load(f)
+            with open(image_path, "rb") as f:
+                annotated = f.read()
+            with open(preview_path, "rb") as f:
+                preview = f.read()
+        except (OSError, ValueError):
+            return None
+        for detection in detections:
+            detection['Bounding Box'] = tuple(detection['Bounding Box'])
+        os.utime(json_path)
+        return {"detections": detections, "annotated": annotated, "preview": preview}
+
+    def _save(self, key, entry):
+        json_path, image_path, preview_path = self._paths(key)
+        # Write the images first: an entry only counts as stored once its JSON exists
+        for path, mode, write in ((image_path, "wb", lambda f: f.write(entry["annotated"])),
+                                  (preview_path, "wb", lambda f: f.write(entry["preview"])),
+                                  (json_path, "w", lambda f: json.dump(entry["detections"], f))):
+            tmp_path = f"{path}.{threading.get_ident()}.tmp"
+            with open(tmp_path, mode) as f:
+                write(f)
+            os.replace(tmp_path, path)
+        size = len(entry["annotated"]) + len(entry["preview"]) + os.path.getsize(json_path)
+        with self.disk_lock:
+            self.disk_size += size - self.disk_sizes.get(key, 0)
+            self.disk_sizes[key] = size
+            over = self.disk_size > self.disk_max_bytes
+        if over:
+            self._trim_disk()
+
+    # Function to list the disk entries as (last use, key, bytes)
+    def _disk_entries(self):
+        entries = []
+        for name in os.listdir(self.disk_dir):
+            if name.endswith(".json"):
+                paths = self._paths(name[:-5])
+                try:
+                    entries.append((os.path.getmtime(paths[0]), name[:-5],
+                                    sum(os.path.getsize(path) for path in paths)))
+                except OSError:
+                    continue
+        return entries
+
+    # Function to delete the least recently used disk entries once over the disk budget. The directory is
+    # recounted here (entries may have been removed by hand), and trimmed to 90% of the budget so the next few
+    # saves don't trim again.
+    def _trim_disk(self):
+        with self.disk_lock:
+            entries = sorted(self._disk_entries())
+            sizes = {key: size for _, key, size in entries}
+            total = sum(sizes.values())
+            for _, key, size in entries:
+                if total <= self.disk_max_bytes * 0.9:
+                    break
+                for path in self._paths(key):
+                    try:
+                        os.remove(path)
+                    except OSError:
+                        pass
+                del sizes[key]
+                total -= size
+            self.disk_sizes, self.disk_size = sizes, total
+
+# Function to estimate the memory held by one cache entry
+def _entry_size(entry):
+    return len(entry["annotated"]) + len(entry["preview"]) + 128 * (len(entry["detections"]) + 1)
+
+# Process-wide cache shared by every Streamlit session
+cache = ResultCache(disk_dir=DEFAULT_DISK_DIR)
@@ -0,0 +1,76 @@
+import hashlib
+import os
+from collections import OrderedDict
+
+# Memory each session's stage graph may hold, overridable from the environment. Every open session holds its
+# own graph, so this stays small: enough for a reduced decode, its preprocessed copy and the previews.
+DEFAULT_MAX_MB = int(os.environ.get("LUMINA_SESSION_CACHE_MB", "32"))
+
+# Function to identify uploaded bytes (stage keys hold this instead of the bytes themselves)
+def content_key(data):
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+# Function to estimate the memory a stage output holds (arrays and encoded images dominate)
+def _size(value):
+    if hasattr(value, "nbytes"):
+        return int(value.nbytes)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return len(value)
+    if isinstance(value, dict):
+        return 64 + sum(_size(item) for item in value.values())
+    if isinstance(value, (list, tuple)):
+        return 64 + sum(_size(item) for item in value)
+    return 64
+
+# Memoized stage outputs for one Streamlit session. A stage's key is its name plus its inputs, which include the
+# keys of the stages it depends on, so changing an input recomputes that stage and everything downstream of it
+# while the upstream outputs are reused. Outputs are kept within max_bytes: stale ones (no longer the current
+# output of their stage) are evicted first, then the least recently used. An output bigger than max_bytes on
+# its own is returned without being kept.
+class StageGraph:
+    def __init__(self, max_bytes=DEFAULT_MAX_MB << 20):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.current = {}
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+
+    # Function to get a stage's output for these inputs, running compute() only when they changed.
+    # Returns (key, output); pass the key as an input of dependent stages.
+    def compute(self, stage, inputs, compute):
+        key = (stage, inputs)
+        self.current[stage] = key
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return key, self.entries[key][0]
+        self.misses += 1
+        value = compute()
+        size = _size(value)
+        if size > self.max_bytes:
+            return key, value
+        self.entries[key] = (value, size)
+        self.size += size
+        self._evict(keep=key)
+        return key, value
+
+    # Function to look up a stage's stored output for these inputs without computing it; returns (found, output)
+    def lookup(self, stage, inputs):
+        entry = self.entries.get((stage, inputs))
+        return (False, None) if entry is None else (True, entry[0])
+
+    def _evict(self, keep):
+        while self.size > self.max_bytes and len(self.entries) > 1:
+            stale = [key for key in self.entries if self.current.get(key[0]) != key]
+            victim = stale[0] if stale else next(key for key in self.entries if key != keep)
+            self.size -= self.entries.pop(victim)[1]
+
+    # Function to drop every stored output (e.g. when the session's upload is removed)
+    def clear(self):
+        self.entries.clear()
+        self.current.clear()
+        self.size = 0
+
+    def stats(self):
+        return {"entries": len(self.entries), "bytes": self.size, "hits": self.hits, "misses": self.misses}
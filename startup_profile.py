@@ -0,0 +1,109 @@
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+
+# Code run in a fresh interpreter per measurement. Each prints its in-process elapsed seconds as JSON.
+#   app_shell        what the Streamlit script imports before it renders the page
+#   app_shell_eager  the same plus the image pipeline, as main.py imported it before lazy loading
+#   pipeline         OpenCV, NumPy and Pillow via pipeline.py (what the background warm-up imports)
+#   first_detection  pipeline, model load and warm-up, and one detection on the fixture image
+TARGETS = {
+    "app_shell": "import main",
+    "app_shell_eager": "import main, pipeline",
+    "pipeline": "import pipeline",
+    "first_detection": (
+        "import model_registry, pipeline\n"
+        "image, _ = pipeline.decode_reduced(open({image!r}, 'rb').read())\n"
+        "pipeline.detect_image(image, 'Olmetie Lettuce')"
+    ),
+}
+MODEL_TARGETS = ("first_detection",)
+
+_RUNNER = """
+import json, time
+start = time.perf_counter()
+{code}
+print(json.dumps({{"seconds": time.perf_counter() - start}}))
+"""
+
+# Function to parse `python -X importtime` output into (module, cumulative ms) for the top-level imports
+def parse_importtime(stderr):
+    imports = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # Nested imports are indented under the module that pulled them in
+        if not name[1:].startswith(" "):
+            imports.append((name.strip(), int(cumulative) / 1000))
+    return imports
+
+# Function to time one target in a fresh interpreter; returns (wall ms, in-process ms, import breakdown)
+def profile_once(code):
+    start = time.perf_counter()
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", _RUNNER.format(code=code)],
+                               capture_output=True, text=True)
+    wall = (time.perf_counter() - start) * 1000
+    if completed.returncode != 0:
+        raise RuntimeError(completed.stderr.strip().splitlines()[-1])
+    seconds = json.loads(completed.stdout.strip().splitlines()[-1])["seconds"]
+    return wall, seconds * 1000, parse_importtime(completed.stderr)
+
+# Function to profile every target, reporting medians and the slowest top-level imports of the last run
+def run(args):
+    results = []
+    for target, code in TARGETS.items():
+        if args.skip_model and target in MODEL_TARGETS:
+            continue
+        walls, inside, imports = [], [], []
+        try:
+            for _ in range(args.repeats):
+                wall, elapsed, imports = profile_once(code.format(image=args.image))
+                walls.append(wall)
+                inside.append(elapsed)
+        except RuntimeError as error:
+            results.append({"target": target, "error": str(error)})
+            continue
+        slowest = sorted(imports, key=lambda item: item[1], reverse=True)[:args.top]
+        results.append({
+            "target": target,
+            "runs": len(walls),
+            "wall_ms": round(statistics.median(walls), 1),
+            "in_process_ms": round(statistics.median(inside), 1),
+            "slowest_imports": [{"module": name, "cumulative_ms": round(ms, 1)} for name, ms in slowest],
+        })
+    return results
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Profile import time and startup of the app in fresh interpreters.")
+    parser.add_argument("--image", default="bg.jpg", help="Fixture image for the first detection")
+    parser.add_argument("--repeats", type=int, default=5, help="Fresh interpreters per target (median reported)")
+    parser.add_argument("--top", type=int, default=10, help="Slowest top-level imports to list per target")
+    parser.add_argument("--skip-model", action="store_true", help="Skip the first detection (no ultralytics needed)")
+    parser.add_argument("--output", help="Write the report as JSON here")
+    args = parser.parse_args(argv)
+
+    results = run(args)
+    for entry in results:
+        if "error" in entry:
+            print(f"{entry['target']:>16}  failed: {entry['error']}")
+            continue
+        print(f"{entry['target']:>16}  wall {entry['wall_ms']:8.1f} ms  in-process {entry['in_process_ms']:8.1f} ms")
+        for item in entry["slowest_imports"]:
+            print(f"{'':>18}{item['module']:<32} {item['cumulative_ms']:8.1f} ms")
+
+    if args.output:
+        report = {
+            "meta": {"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(),
+                     "platform": platform.platform(), "repeats": args.repeats},
+            "results": results,
+        }
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+import numpy as np
+
+# Function to lay out overlapping tile windows (x1, y1, x2, y2) covering a width x height image. Tiles are
+# tile_size square (smaller only along a side shorter than that), neighbours overlap by the given fraction,
+# and the last row and column are shifted back to end at the image edge so no tile needs padding.
+def tile_grid(width, height, tile_size=640, overlap=0.2):
+    if tile_size <= 0 or not 0 <= overlap < 1:
+        raise ValueError("tile_size must be positive and overlap in [0, 1)")
+
+    def starts(length):
+        size = min(tile_size, length)
+        step = max(1, int(size * (1 - overlap)))
+        positions = list(range(0, length - size + 1, step))
+        if positions[-1] + size < length:
+            positions.append(length - size)
+        return positions, size
+
+    xs, tile_width = starts(width)
+    ys, tile_height = starts(height)
+    return [(x, y, x + tile_width, y + tile_height) for y in ys for x in xs]
+
+# Function to merge duplicate boxes across tiles, class by class. rows is an (N, 6) array of x1, y1, x2, y2,
+# confidence, class id in image coordinates. "ios" (intersection over the smaller box) merges greedily: each
+# group of boxes mostly inside one another becomes their union box with the group's highest confidence, so a
+# box clipped at a tile edge, or a part of a plant found in a tile, never replaces the whole plant's box.
+# "iou" is plain NMS: the highest-confidence box of each overlapping group is kept as it is.
+def merge_detections(rows, threshold=0.5, metric="ios"):
+    if metric not in ("ios", "iou"):
+        raise ValueError(f"unknown merge metric {metric!r}, expected 'ios' or 'iou'")
+    rows = np.asarray(rows, dtype=np.float32).reshape(-1, 6)
+    if len(rows) < 2:
+        return rows
+    rows = rows[np.argsort(-rows[:, 4], kind="stable")].copy()
+    x1, y1, x2, y2, _, class_ids = rows.T
+    areas = np.maximum(x2 - x1, 0) * np.maximum(y2 - y1, 0)
+
+    suppressed = np.zeros(len(rows), dtype=bool)
+    for i in range(len(rows)):
+        # With "ios" the box grows as it absorbs others, so it is matched again until nothing more joins it
+        while not suppressed[i]:
+            rest = np.flatnonzero(~suppressed[i + 1:] & (class_ids[i + 1:] == class_ids[i])) + i + 1
+            if not len(rest):
+                break
+            width = np.maximum(np.minimum(x2[i], x2[rest]) - np.maximum(x1[i], x1[rest]), 0)
+            height = np.maximum(np.minimum(y2[i], y2[rest]) - np.maximum(y1[i], y1[rest]), 0)
+            overlap = width * height
+            if metric == "ios":
+                denominator = np.minimum(areas[i], areas[rest])
+            else:
+                denominator = areas[i] + areas[rest] - overlap
+            matched = rest[overlap > threshold * np.maximum(denominator, 1e-6)]
+            suppressed[matched] = True
+            if metric != "ios" or not len(matched):
+                break
+            # The row views write through, so the union box replaces the kept row's box
+            x1[i], y1[i] = min(x1[i], x1[matched].min()), min(y1[i], y1[matched].min())
+            x2[i], y2[i] = max(x2[i], x2[matched].max()), max(y2[i], y2[matched].max())
+            areas[i] = (x2[i] - x1[i]) * (y2[i] - y1[i])
+    return rows[~suppressed]
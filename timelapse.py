@@ -0,0 +1,232 @@
+import argparse
+import csv
+import os
+import queue
+import sys
+import threading
+import time
+
+import cv2
+
+import backends
+import model_registry
+from change_gate import ChangeGate, signature
+from pipeline import IMAGE_EXTENSIONS, annotate_image, detect_batch, preprocess
+from profiles import dominant_stage, stage_totals
+
+# Marks the end of a stage's output
+_DONE = object()
+
+# Function to iterate (frame index, timestamp, frame) over every stride-th frame of a video or frame folder
+def iter_frames(source, stride=1, fps=None):
+    if os.path.isdir(source):
+        names = sorted(name for name in os.listdir(source) if name.lower().endswith(IMAGE_EXTENSIONS))
+        for index in range(0, len(names), stride):
+            frame = cv2.imread(os.path.join(source, names[index]), cv2.IMREAD_COLOR)
+            if frame is not None:
+                yield index, index / fps if fps else None, frame
+        return
+
+    capture = cv2.VideoCapture(source)
+    if not capture.isOpened():
+        raise ValueError(f"cannot open video {source}")
+    fps = fps or capture.get(cv2.CAP_PROP_FPS) or None
+    try:
+        index = 0
+        while True:
+            # grab() advances without converting the skipped frames
+            if index % stride == 0:
+                ok, frame = capture.read()
+                if not ok:
+                    break
+                yield index, index / fps if fps else None, frame
+            elif not capture.grab():
+                break
+            index += 1
+    finally:
+        capture.release()
+
+# Function to read a source's frame rate (None for frame folders without an explicit rate)
+def source_fps(source):
+    if os.path.isdir(source):
+        return None
+    capture = cv2.VideoCapture(source)
+    try:
+        return capture.get(cv2.CAP_PROP_FPS) or None
+    finally:
+        capture.release()
+
+# Function to reduce a frame's detections to stage counts and the dominant (highest total confidence) stage
+def summarize_frame(index, timestamp, detections):
+    counts, weights = stage_totals(detections)
+    return {"frame": index, "time": timestamp, "counts": counts, "stage": dominant_stage(weights)}
+
+# Function to put onto a bounded queue without blocking forever once the pipeline is stopping
+def _put(outbox, item, stop):
+    while not stop.is_set():
+        try:
+            outbox.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+# Function to get from a queue, giving up once the pipeline is stopping
+def _get(inbox, stop):
+    while not stop.is_set():
+        try:
+            return inbox.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    return _DONE
+
+# Decode stage: reads frames and feeds the inference stage
+def _decode_stage(frames, outbox, stop, errors):
+    try:
+        for item in frames:
+            if not _put(outbox, item, stop):
+                return
+    except Exception as error:
+        errors.append(error)
+    finally:
+        _put(outbox, _DONE, stop)
+
+# Inference stage: preprocesses and detects on micro-batches of whatever frames are already decoded. With a
+# change gate, frames that barely differ from the last detected frame reuse its detections.
+def _infer_stage(inbox, outbox, stop, errors, plant_type, conf, batch_size, weights, gate=None):
+    try:
+        finished = False
+        while not finished:
+            batch = [_get(inbox, stop)]
+            if batch[0] is _DONE:
+                break
+            while len(batch) < batch_size:
+                try:
+                    item = inbox.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _DONE:
+                    finished = True
+                    break
+                batch.append(item)
+            detections, signatures, pending = [None] * len(batch), [None] * len(batch), []
+            for i, (_, _, frame) in enumerate(batch):
+                if gate:
+                    signatures[i] = signature(image=frame)
+                    decision, _, previous = gate.check(plant_type, signatures[i])
+                    if decision == "skip":
+                        detections[i] = previous
+                        continue
+                pending.append(i)
+            if pending:
+                found = detect_batch([preprocess(batch[i][2], plant_type) for i in pending],
+                                     conf=conf, batch_size=batch_size, weights=weights)
+                for i, frame_detections in zip(pending, found):
+                    detections[i] = frame_detections
+                    if gate:
+                        gate.update(plant_type, signatures[i], frame_detections)
+            for item, frame_detections in zip(batch, detections):
+                if not _put(outbox, item + (frame_detections,), stop):
+                    return
+    except Exception as error:
+        errors.append(error)
+    finally:
+        _put(outbox, _DONE, stop)
+
+# Function to run decode, inference and annotate/encode concurrently over a video or frame folder.
+# Returns the per-frame growth-stage timeline and throughput figures.
+def run_timelapse(source, plant_type, stride=1, conf=0.25, output_video=None, output_width=None, fps=None,
+                  queue_size=8, batch_size=4, weights=model_registry.MODEL_PATH, on_frame=None,
+                  change_threshold=0.0):
+    fps = fps or source_fps(source)
+    # Whole frames are either reused or re-detected; region refreshes don't fit the batched inference stage
+    gate = ChangeGate(change_threshold, max_region_fraction=0.0) if change_threshold > 0 else None
+    decoded, detected = queue.Queue(maxsize=queue_size), queue.Queue(maxsize=queue_size)
+    stop, errors = threading.Event(), []
+    threads = [
+        threading.Thread(target=_decode_stage, args=(iter_frames(source, stride, fps), decoded, stop, errors),
+                         daemon=True),
+        threading.Thread(target=_infer_stage, args=(decoded, detected, stop, errors, plant_type, conf,
+                                                    batch_size, weights, gate), daemon=True),
+    ]
+
+    timeline, writer = [], None
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    try:
+        while True:
+            item = _get(detected, stop)
+            if item is _DONE:
+                break
+            index, timestamp, frame, detections = item
+            timeline.append(summarize_frame(index, timestamp, detections))
+            if output_video:
+                annotated = annotate_image(frame, detections, output_width)
+                if writer is None:
+                    writer = cv2.VideoWriter(output_video, cv2.VideoWriter_fourcc(*"mp4v"),
+                                             (fps or 30.0) / stride, (annotated.shape[1], annotated.shape[0]))
+                writer.write(annotated)
+            if on_frame:
+                on_frame(timeline[-1])
+    finally:
+        stop.set()
+        for thread in threads:
+            thread.join()
+        if writer is not None:
+            writer.release()
+    if errors:
+        raise errors[0]
+
+    elapsed = time.perf_counter() - start
+    return {
+        "timeline": timeline,
+        "frames": len(timeline),
+        "elapsed": elapsed,
+        "fps": len(timeline) / elapsed if elapsed else 0.0,
+        "source_fps": (timeline[-1]["frame"] + 1) / elapsed if timeline and elapsed else 0.0,
+        "skipped": gate.stats()["skip"] if gate else 0,
+    }
+
+# Function to write the timeline as CSV with one column per growth stage
+def write_timeline(timeline, path):
+    stages = sorted({stage for entry in timeline for stage in entry["counts"]})
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(["frame", "time", "stage"] + stages)
+        for entry in timeline:
+            writer.writerow([entry["frame"], "" if entry["time"] is None else f"{entry['time']:.3f}",
+                             entry["stage"] or ""] + [entry["counts"].get(stage, 0) for stage in stages])
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run growth stage detection over a time-lapse video or frame folder.")
+    parser.add_argument("source", help="Video file or folder of sequential frames")
+    parser.add_argument("--plant-type", required=True, choices=["Olmetie Lettuce", "Thurinus Lettuce"])
+    parser.add_argument("--stride", type=int, default=1, help="Process every Nth frame")
+    parser.add_argument("--conf", type=float, default=0.25, help="Confidence threshold")
+    parser.add_argument("--fps", type=float, help="Frame rate (required for timestamps on frame folders)")
+    parser.add_argument("--output-video", help="Write an annotated video here (.mp4)")
+    parser.add_argument("--output-width", type=int, help="Width of the annotated video (default: source width)")
+    parser.add_argument("--timeline", help="Write the per-frame growth-stage timeline here (.csv)")
+    parser.add_argument("--change-threshold", type=float, default=0.0,
+                        help="Reuse the last detections for frames that changed less than this (0 = always detect)")
+    parser.add_argument("--batch-size", type=int, default=4, help="Frames per model.predict call")
+    parser.add_argument("--queue-size", type=int, default=8, help="Capacity of each stage queue")
+    parser.add_argument("--weights", default=model_registry.MODEL_PATH, help="YOLO weight file")
+    parser.add_argument("--backend", default=backends.DEFAULT_BACKEND, choices=backends.BACKENDS,
+                        help="Inference engine (exported next to the weights on first use)")
+    args = parser.parse_args(argv)
+    model_registry.set_backend(args.backend)
+
+    result = run_timelapse(args.source, args.plant_type, stride=args.stride, conf=args.conf,
+                           output_video=args.output_video, output_width=args.output_width, fps=args.fps,
+                           queue_size=args.queue_size, batch_size=args.batch_size, weights=args.weights,
+                           change_threshold=args.change_threshold)
+    if args.timeline:
+        write_timeline(result["timeline"], args.timeline)
+    print(f"Processed {result['frames']} frames in {result['elapsed']:.1f}s "
+          f"({result['fps']:.1f} frames/s, {result['source_fps']:.1f} source frames/s, "
+          f"{result['skipped']} unchanged frames skipped)", file=sys.stderr)
+
+if __name__ == '__main__':
+    main()